@@ -9,6 +9,7 @@ from lib.ImageHandler import ImageHandler
 from lib.Primitives import GameObject
 from lib.Settings import Settings
 from lib.Sprite import StaticSprite
+from lib.TextHandler import TextHandler
 from lib.Primitives import Pose
 import pygame
 from lib.Math import lerp, PowerCurve
@@ -373,6 +374,8 @@ class InfoBook(GameObject):
 
     SPELL_MODE = 0
     ENEMY_MODE = 1
+    FONT = "fonts/pixantiqua.ttf"
+    FONT_SIZE = 12
 
     def __init__(self, menu):
         super().__init__()
@@ -403,7 +406,6 @@ class InfoBook(GameObject):
                                    grow_percent=0,
                                    pulse = False)
 
-        self.spell_list_font = pygame.font.Font("fonts/pixantiqua.ttf", 12)
 
         self.spell_help = ImageHandler.load("images/ui/spell_help.png")
         self.enemy_help = ImageHandler.load("images/ui/enemy_help.png")
@@ -426,12 +428,10 @@ class InfoBook(GameObject):
         for spell in self.spell_list:
 
             spell = spell.capitalize()
-            letters = []
+            colors = []
             if spell in [spell.__class__.__name__ for spell in self.menu.player.spells if spell]:
-                color = (48, 3, 217)
                 spell = "* " + spell.capitalize() + " *"
-                for letter in spell:
-                    letters.append(self.spell_list_font.render(letter, 0, (color)))
+                colors = [(48, 3, 217)] * len(spell)
             else:
                 available = available_spell_letters.copy()
                 for letter in spell:
@@ -440,20 +440,17 @@ class InfoBook(GameObject):
                         color = (191, 111, 74)
                     else:
                         available.remove(letter.upper())
-                    letters.append(self.spell_list_font.render(letter, 0, (color)))
-            self.spell_list_surfs.append(letters)
+                    colors.append(color)
+            self.spell_list_surfs.append(TextHandler.word(self.FONT, self.FONT_SIZE, spell, colors))
 
     def compile_enemy_names(self):
         self.enemy_list = Settings.Dynamic.KNOWN_ENEMIES.copy()
         self.enemy_list_surfs = []
         for enemy in self.enemy_list:
-            letters = []
-            for i, letter in enumerate(enemy.capitalize()):
-                color = (191, 111, 74)
-                if i >= len(EnemyDropHandler.get_drops_so_far(enemy.upper())):
-                    color = 87, 28, 39
-                letters.append(self.spell_list_font.render(letter, 1, color))
-            self.enemy_list_surfs.append(letters)
+            drops = len(EnemyDropHandler.get_drops_so_far(enemy.upper()))
+            colors = [(191, 111, 74) if i < drops else (87, 28, 39) for i in range(len(enemy))]
+            self.enemy_list_surfs.append(TextHandler.word(self.FONT, self.FONT_SIZE, enemy.capitalize(), colors,
+                                                          antialias=True))
 
     def draw_spell_names(self, surf, offset=(0, 0)):
         x = offset[0] + self.position.x
@@ -462,13 +459,9 @@ class InfoBook(GameObject):
         surf.blit(self.spell_help, (x + 1 - self.spell_help.get_width()//2, y - 5))
         y += self.spell_help.get_height() + 5
 
-        for letter_list in self.spell_list_surfs:
-            x = offset[0] + self.position.x
-            width = sum([item.get_width() for item in letter_list])
-            x -= width//2
-            for letter in letter_list:
-                surf.blit(letter, (x, y - letter.get_height()//2))
-                x += letter.get_width()
+        for word in self.spell_list_surfs:
+            x = offset[0] + self.position.x - word.get_width()//2
+            surf.blit(word, (x, y - word.get_height()//2))
             y += 12
 
     def draw_enemy_names(self, surf, offset=(0, 0)):
@@ -477,13 +470,9 @@ class InfoBook(GameObject):
 
         surf.blit(self.enemy_help, (x + 1 - self.enemy_help.get_width()//2, y - 5))
         y += self.enemy_help.get_height() + 5
-        for letter_list in self.enemy_list_surfs:
-            x = offset[0] + self.position.x
-            width = sum([item.get_width() for item in letter_list])
-            x -= width//2
-            for letter in letter_list:
-                surf.blit(letter, (x, y - letter.get_height() // 2))
-                x += letter.get_width()
+        for word in self.enemy_list_surfs:
+            x = offset[0] + self.position.x - word.get_width()//2
+            surf.blit(word, (x, y - word.get_height()//2))
             y += 12
 
     def select_enemy_tab(self):
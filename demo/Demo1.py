@@ -3,13 +3,14 @@ from re import A
 from turtle import goto
 import pygame
 import sys
-import yaml
 import math
 import time
 
 from demo.Callout import CalloutManager
 from demo.EnemyDropHandler import EnemyDropHandler
 from demo.Pickup import LostPage, HealthPickup
+from demo.RoomGrid import RoomGrid
+from demo.RoomLibrary import RoomLibrary
 from demo.SpellHUD import SpellHUD
 from lib.Animation import Spawn
 from lib.GridEntity import GridEntity
@@ -19,19 +20,35 @@ from lib.Camera import Camera
 from lib.Primitives import Pose
 from lib.Scene import TitleScreen, GameOverScreen
 from lib.Settings import Settings
-import random
+from lib.RenderQueue import RenderQueue
+from lib.Presenter import Presenter
+from lib.RandomStreams import RandomStreams
 from demo.Player import Player
 from demo.Wall import Wall, Floor, Decorator, Exit, Stair
 from demo.Enemy import Bat, Spider, Wolf, Slime, Orc, Shade, Dragon, Demon
 from demo.TurnManager import TurnManager
 from demo.CraftingMenu import CraftingMenu
 from demo.ParticleHandler import ParticleHandler
-import threading
-import os
+from demo.SpellEffect import SpellEffect
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from lib.Math import lerp
 
 class Game:
-    def __init__(self):
+    DOOR_CHARACTERS = "UDLR"  # Temporary walls in rooms, which become walls or floor depending on neighbouring rooms
+    SOLID_CHARACTERS = b"XS"  # Characters of tiles that are solid once the level starts; exits get opened
+    ENEMY_TYPES = {enemy_type.__name__: enemy_type for enemy_type in (Bat, Spider, Wolf, Slime, Orc, Shade, Dragon, Demon)}
+
+    level_executor = None  # Process pool that plans upcoming levels, shared by every game
+    level_plans = {}  # Futures for level plans that haven't been used yet, by dungeon level
+
+    def __init__(self, seed=None):
+        """
+        Starts the game
+        :param seed: Seed for every run, so they play out the same. By default, each run gets a new random one.
+        """
+        self.seed = seed
         pygame.init()
         EnemyDropHandler.init()
         ImageHandler.init()
@@ -43,6 +60,7 @@ class Game:
 
         self.screen = pygame.Surface((640, 360))
         self.true_screen = pygame.display.set_mode((1280, 720))
+        Presenter.init(self.screen, self.true_screen)
         self.fps_font = pygame.font.SysFont("monospace", 10, 1, 0)
         self.fpss = []
         pygame.display.set_caption(Settings.Static.WINDOW_CAPTION)
@@ -79,17 +97,19 @@ class Game:
     def run_game_from_menu(self):
         while True:
             self.run_menu()
-            self.on_run_start()
+            self.on_run_start(self.seed)
             while True:
                 self.main()
                 if self.game_over:
                     self.run_game_over()
                     break
 
-    def on_run_start(self):
+    def on_run_start(self, seed=None):
         """
         Run when you first start a run
+        :param seed: Seed for the run's random streams. By default, a new random one.
         """
+        RandomStreams.seed_run(seed)
         EnemyDropHandler.init()  # Don't keep drop history from previous run
         self.stored_player_spells = []  # Don't keep spells from previous run
         self.stored_player_letters = []
@@ -97,6 +117,9 @@ class Game:
         self.current_dungeon_level = 1
         self.game_over = False
         self.stored_player_health = Player.hit_points
+        for future in self.level_plans.values():
+            future.cancel()
+        self.level_plans = {}
 
     def run_game_over(self):
         menu_scene = GameOverScreen(self.current_dungeon_level)
@@ -108,11 +131,7 @@ class Game:
             menu_scene.update(dt, events)
             menu_scene.draw(self.screen, (0, 0))
 
-            scaled = pygame.transform.scale(self.screen, (Settings.Static.WINDOW_WIDTH, Settings.Static.WINDOW_HEIGHT))
-            self.true_screen.blit(scaled, (0, 0))
-            pygame.display.flip()
-
-            pygame.display.flip()
+            Presenter.present()
 
     def run_menu(self):
         menu_scene = TitleScreen()
@@ -124,11 +143,7 @@ class Game:
             menu_scene.update(dt, events)
             menu_scene.draw(self.screen, (0, 0))
 
-            scaled = pygame.transform.scale(self.screen, (Settings.Static.WINDOW_WIDTH, Settings.Static.WINDOW_HEIGHT))
-            self.true_screen.blit(scaled, (0, 0))
-            pygame.display.flip()
-
-            pygame.display.flip()
+            Presenter.present()
 
     def update_fpss(self, dt, events):
         self.fpss.append(dt)
@@ -144,27 +159,15 @@ class Game:
         surf = self.fps_font.render(f"FPS:{' '*max(0,6-len(fps))}{fps}", False, (255, 255, 255))
         self.screen.blit(surf, (10, 340))
 
-    def get_yaml_room(self, path):
-        """
-        Loads a room from a yaml file. Returns None if no path is found.
-        :param path: The file path
-        :return: The contents of the yaml file or None
-        """
-        try:
-            with open(path) as file:
-                return yaml.safe_load(file)
-        except:
-            return None
-
     @staticmethod
     def merge_room_onto_character_array(room, array, origin=(0, 0), closed_walls=""):
         """
         Copies the contents of the room onto the array, overwriting any prior contents
         :param room: An object with property "tiles" that contains a list of strings
-        :param array: A list of strings
+        :param array: A list of bytearrays, one per row of the map
         :param origin: The top left coordinate of the room, in room coordinates.
         :param closed_walls: An iterable of characters that should be treated as walls when the room is merged. Probably
-            some combination of U, D, L, R for the temporary walls.
+            some combination of U, D, L, R for the temporary walls. Any other temporary walls become floor.
         """
         tiles = room["tiles"]
         th = len(tiles)
@@ -172,29 +175,54 @@ class Game:
 
         origin = origin[0] * Settings.Static.ROOM_WIDTH, origin[1] * Settings.Static.ROOM_HEIGHT
 
-        for y, row in enumerate(array):
-            new_row = ""
-            for x, item in enumerate(row):
-                if 0 <= y - origin[1] < th and 0 <= x - origin[0] < tw:
-                    char = tiles[y - origin[1]][x - origin[0]]
-                    if char in closed_walls:
-                        char = "X"
-                    new_row += char
-                else:
-                    new_row += item
-            array[y] = new_row
+        closed = "".join(char for char in Game.DOOR_CHARACTERS if char in closed_walls)
+        opened = "".join(char for char in Game.DOOR_CHARACTERS if char not in closed_walls)
+        table = bytes.maketrans((closed + opened).encode(), b"X" * len(closed) + b"." * len(opened))
+
+        # Clip the room to the array
+        left = max(origin[0], 0)
+        right = min(origin[0] + tw, len(array[0]))
+        if left >= right:
+            return
+        for y in range(max(origin[1], 0), min(origin[1] + th, len(array))):
+            row = tiles[y - origin[1]].encode()
+            array[y][left:right] = row[left - origin[0]:right - origin[0]].translate(table)
+
+    @staticmethod
+    def character_array_to_strings(array):
+        """
+        Converts a character array made by generate_map into a list of strings, one per row
+        :param array: A list of bytearrays
+        :return: A list of strings
+        """
+        return [row.decode() for row in array]
 
     def generate_map(self):
+        """
+        Generates a map for the current dungeon level, all at once on this thread
+        :return: The map
+        """
+        level = self.current_dungeon_level
+        return self.build_map(self.plan_level(level, RandomStreams.level_seed(level)))
+
+    @staticmethod
+    def plan_level(level, seed):
+        """
+        Lays out a dungeon level: places its rooms, resolves their doors, and decides where enemies spawn. Only uses
+        plain data, so it can run in another process.
+        :param level: The dungeon level
+        :param seed: The level's seed, from RandomStreams.level_seed
+        :return: Dictionary with the level's "level", "character_map", "map_data", "room_grid" and "enemies"
+        """
+        rng = RandomStreams.stream_from(seed, RandomStreams.MAPGEN)
 
-        lerpAmount = (self.current_dungeon_level - 1)/6
+        lerpAmount = (level - 1)/6
         mapLength = int(lerp(2,7, lerpAmount))
 
-        lerpAmount = (self.current_dungeon_level - 1) / 7
+        lerpAmount = (level - 1) / 7
         mapExtraRooms = int(lerp(0, 9, lerpAmount))
 
-        mapBossRoom = "rooms/boss_room_1.yaml"
         roomAttemptLimit = 20
-        placementAttemptLimit = 60
 
 
         # TODO: Somehow determine a good height for the map, in tiles.
@@ -204,31 +232,16 @@ class Game:
         width = Settings.Static.ROOM_WIDTH * mapWidth
         height = Settings.Static.ROOM_HEIGHT * mapHeight
 
-        # Don't change any of this
-        map = Map(width, height)
-        _entity_layer = map.add_empty_layer(0)
-        _pickup_layer = map.add_empty_layer(Settings.Static.PICKUP_LAYER)
-        floor_layer = map.add_empty_layer(1)
-        floor_layer.enable_updates(False)  # Don't waste time calling update on floor tiles
-
         # Using rooms from yaml, assemble the map.
         # TODO Daniel improve this section
-        
-        wall = "X"
-        floor = "."
-        up, down, left, right = "U", "D", "L", "R"
 
-        PATHS = os.listdir("rooms/small_rooms")
-
-        rooms = []
-        for path in PATHS:
-            rooms.append(self.get_yaml_room("rooms/small_rooms/" + path))
+        rooms = RoomLibrary.small_rooms()
         
         centerX = mapWidth//2
         centerY = mapHeight//2
 
         # Make array of wall tiles the size of the map to add rooms into
-        stringMap = [wall * width for _ in range(height)] 
+        characterMap = [bytearray(b"X" * width) for _ in range(height)]
 
         # Spawn Room
 
@@ -237,13 +250,15 @@ class Game:
         branchBaseX = centerX
         branchBaseY = centerY
 
-        roomGrid = []
+        roomGrid = None
 
         #generate main path
         for mapGenAttempt in range(50):
 
-            roomGrid = [[False for _ in range(mapWidth)] for _ in range(mapHeight)]
-            roomGrid[centerX][centerY] = True
+            roomGrid = RoomGrid(mapWidth, mapHeight)
+            roomGrid.place(centerX, centerY, 1, 1)
+            currentX = centerX
+            currentY = centerY
 
             mapData = []
             generationSuceeded = True
@@ -255,57 +270,27 @@ class Game:
 
                     # pick a room
                     if(stepCount == mapLength - 1):
-                        room = self.get_yaml_room("rooms/special_rooms/exit_room.yaml")
+                        room = RoomLibrary.get("special_rooms/exit_room")
                     else:
-                        room = random.choice(rooms)
+                        room = rng.choice(rooms)
 
                     roomWidth = room["width"]
                     roomHeight = room["height"]
 
-                    #place attempt code
-                    for placeAttemptCount in range(placementAttemptLimit):
-
-                        attemptX = random.randrange(-roomWidth, 2)
-                        attemptY = random.randrange(-roomHeight, 2)
-
-                        # If same space or not connected due to angle
-                        if ((attemptX == 0 and attemptY == 0) or (abs(attemptX) == roomWidth and abs(attemptY) == roomHeight)):
-                            continue
-
-                        if not attemptX in range(-roomWidth + 1, 1) and not attemptY in range(-roomHeight + 1, 1):
-                            continue
-
-                        attemptX = currentX + attemptX
-                        attemptY = currentY + attemptY
-
-                        # checking logic here
-
-                        placementAllowed = True
-                        for roomSpaceX in range(roomWidth):
-                            for roomSpaceY in range(roomHeight):
-                                try:
-                                    if roomGrid[roomSpaceX + attemptX][roomSpaceY + attemptY]:
-                                        placementAllowed = False
-                                except:
-                                    placementAllowed = False
-
-                        if not placementAllowed:
-                            continue
-
-                        #place stuff time
-                        for roomSpaceX in range(roomWidth):
-                            for roomSpaceY in range(roomHeight):
-                                roomGrid[roomSpaceX + attemptX][roomSpaceY +attemptY] = True
-
-                        mapData.append([attemptX, attemptY, room])
-                        currentX = attemptX
-                        currentY = attemptY
-                        placementSucceded = True
-                        break
-
-                    if not placementSucceded:
+                    # Every spot next to the last room that the new one fits in
+                    anchors = roomGrid.anchors(currentX, currentY, roomWidth, roomHeight,
+                                               RoomGrid.path_offsets(roomWidth, roomHeight))
+                    if not anchors:
                         continue
 
+                    #place stuff time
+                    attemptX, attemptY = rng.choice(anchors)
+                    roomGrid.place(attemptX, attemptY, roomWidth, roomHeight)
+
+                    mapData.append([attemptX, attemptY, room])
+                    currentX = attemptX
+                    currentY = attemptY
+                    placementSucceded = True
                     break
 
                 if not placementSucceded:
@@ -317,67 +302,31 @@ class Game:
 
         #spam extra rooms
         for extraRoomAttempts in range(mapExtraRooms):
-            randomRoomX = random.randrange(0,Settings.Static.MAP_WIDTH)
-            randomRoomY = random.randrange(0,Settings.Static.MAP_HEIGHT)
-            #``````````````````````````
 
-            placementSucceded = False
             for roomAttemptCount in range(50):
 
                 # pick a room
-                room = random.choice(rooms)
+                room = rng.choice(rooms)
                 roomWidth = room["width"]
                 roomHeight = room["height"]
 
-                # place attempt code
-                for placeAttemptCount in range(placementAttemptLimit):
-
-                    attemptX = random.randrange(-roomWidth, roomWidth + 1)
-                    attemptY = random.randrange(-roomHeight, roomHeight + 1)
-
-                    # If same space or not connected due to angle
-                    if (attemptX == 0 and attemptY == 0) or (
-                            abs(attemptX) == roomWidth and abs(attemptY) == roomHeight):
-                        continue
-
-                    attemptX = currentX + attemptX
-                    attemptY = currentY + attemptY
-
-                    # checking logic here
-
-                    placementAllowed = True
-                    for roomSpaceX in range(roomWidth):
-                        for roomSpaceY in range(roomHeight):
-                            try:
-                                if roomGrid[roomSpaceX + attemptX][roomSpaceY + attemptY]:
-                                    placementAllowed = False
-                            except:
-                                placementAllowed = False
-
-                    if not placementAllowed:
-                        continue
-
-                    # place stuff time
-                    for roomSpaceX in range(roomWidth):
-                        for roomSpaceY in range(roomHeight):
-                            roomGrid[roomSpaceX + attemptX][roomSpaceY + attemptY] = True
-
-                    mapData.append([attemptX, attemptY, room])
-                    currentX = attemptX
-                    currentY = attemptY
-                    placementSucceded = True
-                    break
-
-                if not placementSucceded:
+                anchors = roomGrid.anchors(currentX, currentY, roomWidth, roomHeight,
+                                           RoomGrid.neighbour_offsets(roomWidth, roomHeight))
+                if not anchors:
                     continue
 
-                break
+                # place stuff time
+                attemptX, attemptY = rng.choice(anchors)
+                roomGrid.place(attemptX, attemptY, roomWidth, roomHeight)
 
-            #````````````````````````
+                mapData.append([attemptX, attemptY, room])
+                currentX = attemptX
+                currentY = attemptY
+                break
 
         if generationSuceeded:
 
-            self.merge_room_onto_character_array(self.get_yaml_room("rooms/special_rooms/spawn_room.yaml"), stringMap,(centerX, centerY), closed_walls=[])
+            Game.merge_room_onto_character_array(RoomLibrary.get("special_rooms/spawn_room"), characterMap,(centerX, centerY), closed_walls=[])
 
             #PURGE U D L R
 
@@ -386,60 +335,66 @@ class Game:
 
                 valid_chars = ["U", "D", "L", "R"]
 
+                roomX, roomY, room = roomToPlace
                 closed_walls = []
-                try:
-                    for blep in range(roomToPlace[2]["height"]):
-                        if roomGrid[roomToPlace[0] - 1][roomToPlace[1]+blep]:
-                            closed_walls.append("L")
-                except:
-                    pass
-
-                try:
-                    for blep in range(roomToPlace[2]["height"]):
-                        if roomGrid[roomToPlace[0] + roomToPlace[2]["width"]][roomToPlace[1] + blep]:
-                            closed_walls.append("R")
-                except:
-                    pass
-
-                try:
-                    for blep in range(roomToPlace[2]["width"]):
-                        if roomGrid[roomToPlace[0] + blep][roomToPlace[1] - 1]:
-                            closed_walls.append("U")
-                except:
-                    pass
-
-                try:
-                    for blep in range(roomToPlace[2]["width"]):
-                        if roomGrid[roomToPlace[0] + blep][roomToPlace[1] + roomToPlace[2]["height"]]:
-                            closed_walls.append("D")
-                except:
-                    pass
+                if any(roomGrid.is_occupied(roomX - 1, roomY + blep) for blep in range(room["height"])):
+                    closed_walls.append("L")
+                if any(roomGrid.is_occupied(roomX + room["width"], roomY + blep) for blep in range(room["height"])):
+                    closed_walls.append("R")
+                if any(roomGrid.is_occupied(roomX + blep, roomY - 1) for blep in range(room["width"])):
+                    closed_walls.append("U")
+                if any(roomGrid.is_occupied(roomX + blep, roomY + room["height"]) for blep in range(room["width"])):
+                    closed_walls.append("D")
 
                 for char in closed_walls:
                     if(char in valid_chars):
                         valid_chars.remove(char)
 
-                self.merge_room_onto_character_array(roomToPlace[2], stringMap, (roomToPlace[0], roomToPlace[1]), valid_chars)
+                Game.merge_room_onto_character_array(roomToPlace[2], characterMap, (roomToPlace[0], roomToPlace[1]), valid_chars)
         else:
-            self.merge_room_onto_character_array(self.get_yaml_room("rooms/special_rooms/backup.yaml"), stringMap,(centerX, centerY), closed_walls=[])
+            Game.merge_room_onto_character_array(RoomLibrary.get("special_rooms/backup"), characterMap,(centerX, centerY), closed_walls=[])
+
+        return {
+            "level": level,
+            "character_map": characterMap,
+            "map_data": mapData,
+            "room_grid": roomGrid.as_lists(),
+            "enemies": Game.plan_enemies(level, characterMap, RandomStreams.stream_from(seed, RandomStreams.SPAWNS)),
+        }
+
+    def build_map(self, plan):
+        """
+        Creates the map for a level planned by plan_level
+        :param plan: The level plan
+        :return: The map
+        """
+        RandomStreams.seed_level(plan["level"])
+        characterMap = plan["character_map"]
+        self.mapdata = plan["map_data"]
+        self.room_grid = plan["room_grid"]
+        self.character_map = characterMap
+        self.enemy_plan = plan["enemies"]
+
+        # Don't change any of this
+        map = Map(len(characterMap[0]), len(characterMap))
+        _entity_layer = map.add_empty_layer(0)
+        _pickup_layer = map.add_empty_layer(Settings.Static.PICKUP_LAYER)
+        floor_layer = map.add_empty_layer(1)
+        floor_layer.enable_updates(False)  # Don't waste time calling update on floor tiles
+        floor_layer.enable_baking()  # Floor tiles don't move, so draw them from cached chunks
 
-        self.mapdata = mapData;
-        self.room_grid = roomGrid;
-        #apply U D L R in tile_array into floors based on room coordinates
-        #searches based on room coordinate
+        wall, exit_character, stair = b"XES"
 
         # Turn our room array back into a map.
         exits = []
-        for y, row in enumerate(stringMap):
+        for y, row in enumerate(characterMap):
             for x, item in enumerate(row):
-                if item is wall:
-                    new_tile = Wall()
-                elif item is wall:
+                if item == wall:
                     new_tile = Wall()
-                elif item == "E":
+                elif item == exit_character:
                     new_tile = Exit()
                     exits.append(new_tile)
-                elif item == "S":
+                elif item == stair:
                     new_tile = Stair()
                 else:
                     new_tile = Floor()
@@ -458,19 +413,21 @@ class Game:
 
     def add_decorators(self, map):
         new_layer = map.add_empty_layer(Settings.Static.DECORATOR_LAYER)
+        new_layer.enable_baking()
         floor_layer = map.get_layer(1)
+        decor = RandomStreams.get(RandomStreams.DECOR)
         for cell, x, y in floor_layer.populated_cells_and_coordinates():
             for item in cell:
                 if type(item) == Floor:
-                    if random.random() < 0.03:
+                    if decor.random() < 0.03:
                         self.add_decorator(new_layer, x, y, True)
                     break
                 if type(item) == Wall:
                     if new_layer.cell_in_range(x, y+1):
-                        cell = map.get_layer(1).peek_at_cell(x, y+1)
+                        cell = map.get_layer(1).view_cell(x, y+1)
                         for item in cell:
                             if type(item) == Floor:
-                                if random.random() < 0.1:
+                                if decor.random() < 0.1:
                                     self.add_decorator(new_layer, x, y, False)
                                     break
                     break
@@ -480,72 +437,141 @@ class Game:
 
     def load_layer_sprites(self, layer):
         # This is necessary to pick the right tile sprites after the map has been generated
-        for cell in layer.populated_cells():
+        codes = layer.neighbourhood_codes()
+        for cell, x, y in layer.populated_cells_and_coordinates():
             for tile in cell:
-                tile.load_sprite()
+                tile.load_sprite(codes[y * layer.map.width + x])
 
-    def spawn_enemies(self, layer, player):
-        enemies = 0
-        enemy_objects = []
+    @staticmethod
+    def plan_enemies(level, character_map, rng):
+        """
+        Decides which enemies spawn where on a level
+        :param level: The dungeon level
+        :param character_map: The level's character map
+        :param rng: The random number generator to use
+        :return: List of (enemy class name, x, y) tuples
+        """
+        enemy_plan = []
         frequency = 0.06
 
         enimies = [Bat, Wolf, Spider, Slime, Slime, Orc, Shade, Wolf, Demon, Slime, Orc, Shade, Dragon]
 
-        if self.current_dungeon_level == 1:
+        if level == 1:
             frequency = 0.025
             enemy_types = [Bat, Bat, Wolf]
-        elif self.current_dungeon_level == 2:
+        elif level == 2:
             frequency = 0.0275
             enemy_types = [Bat, Wolf, Spider, Wolf]
-        elif self.current_dungeon_level == 3:
+        elif level == 3:
             frequency = 0.035
             enemy_types = [Bat, Bat, Slime, Slime, Wolf]
-        elif self.current_dungeon_level == 4:
+        elif level == 4:
             frequency = 0.035
             enemy_types = [Spider, Spider, Wolf, Spider, Spider, Shade, Wolf]
-        elif self.current_dungeon_level == 5:
+        elif level == 5:
             frequency = 0.03
             enemy_types = [Spider, Bat, Bat, Orc, Slime, Slime, Orc]
-        elif self.current_dungeon_level == 6:
+        elif level == 6:
             frequency = 0.0175
             enemy_types = [Demon, Demon, Shade, Shade, Demon, Demon, Shade, Shade, Orc, Shade, Bat]
-        elif self.current_dungeon_level == 7:
+        elif level == 7:
             frequency = 0.0175
             enemy_types = [Dragon, Bat, Bat, Bat, Bat, Dragon, Dragon, Spider, Orc, Wolf, Spider] #replace with dragon
-        elif self.current_dungeon_level == 42:
+        elif level == 42:
             frequency = 0.1
             enemy_types = [Slime]
         else:
-            lerpAmount = (self.current_dungeon_level - 8)/40
+            lerpAmount = (level - 8)/40
             frequency = lerp(0.025, .15, lerpAmount)
             enemy_types = []
 
             for i in range(10):
-                enemy_types.append(random.choice(enemies))
+                enemy_types.append(rng.choice(enimies))
 
             if enemy_types == []:
                 enemy_types = [Bat]
                 frequency = .15
 
-        for x, y in layer.cell_coordinates():
-            if (Pose((x, y)) - Pose((7 + Settings.Static.ROOM_WIDTH * Settings.Static.MAP_WIDTH // 2, 7 + Settings.Static.ROOM_HEIGHT * Settings.Static.MAP_HEIGHT // 2)) ).magnitude() < 9:
-                continue
-            if not any([item.solid for item in layer.map.get_all_at_position(x, y)]) and random.random() < frequency:
-                enemy_type = random.choice(enemy_types)
-                enemy = enemy_type()
-                enemy_objects.append(enemy)
-                layer.add_to_cell(enemy, x, y)
-                enemies += 1
+        for y, row in enumerate(character_map):
+            for x, item in enumerate(row):
+                if (Pose((x, y)) - Pose((7 + Settings.Static.ROOM_WIDTH * Settings.Static.MAP_WIDTH // 2, 7 + Settings.Static.ROOM_HEIGHT * Settings.Static.MAP_HEIGHT // 2)) ).magnitude() < 9:
+                    continue
+                if item not in Game.SOLID_CHARACTERS and rng.random() < frequency:
+                    enemy_type = rng.choice(enemy_types)
+                    enemy_plan.append((enemy_type.__name__, x, y))
+
+        return enemy_plan
 
+    def spawn_enemies(self, layer, player):
+        """
+        Adds the enemies planned for the last map generated
+        :param layer: The layer to add them to
+        :param player: The player
+        :return: List of the enemies
+        """
+        enemy_objects = []
+        for name, x, y in self.enemy_plan:
+            enemy = Game.ENEMY_TYPES[name]()
+            enemy_objects.append(enemy)
+            layer.add_to_cell(enemy, x, y)
         return enemy_objects
 
-    def loading_anim(self):
+    def get_level_executor(self):
+        """
+        Returns the process pool levels are planned in, starting it if needed
+        :return: The executor, or None if this platform can't run one
+        """
+        if Game.level_executor is None:
+            try:
+                Game.level_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, NotImplementedError, ImportError):
+                return None
+        return Game.level_executor
+
+    def prefetch_level_plan(self, level):
+        """
+        Starts planning a dungeon level in the background, if it isn't already
+        :param level: The dungeon level
+        :return: A future for the level plan
+        """
+        future = self.level_plans.get(level)
+        if future is None:
+            seed = RandomStreams.level_seed(level)
+            executor = self.get_level_executor()
+            if executor is not None:
+                future = executor.submit(Game.plan_level, level, seed)
+            else:
+                future = Future()
+                future.set_result(Game.plan_level(level, seed))
+            self.level_plans[level] = future
+        return future
+
+    def take_level_plan(self, level):
+        """
+        Gets the plan for a dungeon level, showing the loading screen while it's still being made
+        :param level: The dungeon level
+        :return: The level plan
+        """
+        future = self.prefetch_level_plan(level)
+        del self.level_plans[level]
+        self.loading_anim(future)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            Game.level_executor = None  # The worker died; plan levels here from now on
+            return Game.plan_level(level, RandomStreams.level_seed(level))
+
+    def loading_anim(self, future):
+        """
+        Shows the loading screen until a level plan is ready, for at least one frame
+        :param future: The future for the level plan
+        """
         font = pygame.font.Font("fonts/smallest_pixel.ttf", 10)
         letters = [font.render(letter, 0, (255, 255, 255)) for letter in "LOADING"]
         width = sum([letter.get_width() for letter in letters])
         t = 0
         clock = pygame.time.Clock()
-        while self.loading:
+        while True:
             x, y = Settings.Static.GAME_WIDTH // 2, Settings.Static.GAME_HEIGHT // 2
             i = 0
             x -= width // 2
@@ -555,27 +581,28 @@ class Game:
                 self.screen.blit(letter, (x, y + math.sin(t * 8 - i)*2))
                 x += letter.get_width()
             events = pygame.event.get()
+            for event in events:
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit(0)
 
-            t += clock.tick()/1000
+            t += clock.tick(60)/1000
 
-            scaled = pygame.transform.scale(self.screen, (Settings.Static.WINDOW_WIDTH, Settings.Static.WINDOW_HEIGHT))
-            self.true_screen.blit(scaled, (0, 0))
-            pygame.display.flip()
+            Presenter.present()
+            if future.done():
+                break
 
 
     def main(self):
 
         TurnManager.init()
         ParticleHandler.init()
+        ParticleHandler.prewarm([*SpellEffect.FWOOSH_COLORS.values(), SpellEffect.DEFAULT_FWOOSH_COLOR])
         self.proceed_to_next_level = False
         self.ending = False
         self.starting = True
 
-        self.loading = True
-        t = threading.Thread(target=self.loading_anim, daemon=True)
-        t.start()
-        map = self.generate_map()
-        self.loading = False
+        map = self.build_map(self.take_level_plan(self.current_dungeon_level))
 
         player = Player()
         player.add_starting_spells(self.stored_player_spells)
@@ -595,6 +622,7 @@ class Game:
         crafting_menu = CraftingMenu(player)
         enemies = self.spawn_enemies(map.get_layer(0), player)
         TurnManager.add_entities(player)
+        self.prefetch_level_plan(self.current_dungeon_level + 1)  # Lay out the next level while this one is played
         vignette = ImageHandler.load("images/vignette.png")
 
         Camera.change_objects(objects=[player], weights=[1], mouse_weight=0.15)
@@ -649,23 +677,25 @@ class Game:
             CalloutManager.update(dt, events)
             map.update(dt, events)
             crafting_menu.update(dt, events)
+            RenderQueue.begin()
             map.draw(self.screen, offset)
             ParticleHandler.update(dt, events)
             ParticleHandler.draw(self.screen, offset=offset)
+            RenderQueue.end()
 
             self.screen.blit(vignette, (0, 0), special_flags=pygame.BLEND_MULT)
 
             self.draw_fps_font()
 
             crafting_menu.draw(self.screen, (0, 0))
+            RenderQueue.begin()
             spell_hud.draw(self.screen, (10, 10))
+            RenderQueue.end()
             CalloutManager.draw(self.screen)
             if self.shade_shown > 0:
                 self.screen.blit(self.black, (0, 0))
 
-            scaled = pygame.transform.scale(self.screen, (Settings.Static.WINDOW_WIDTH, Settings.Static.WINDOW_HEIGHT))
-            self.true_screen.blit(scaled, (0, 0))
-            pygame.display.flip()
+            Presenter.present()
 
             if player.advanced or player.game_over:
                 self.ending = True
@@ -3,17 +3,20 @@ import demo.EnemyAI as Ai
 import demo.EnemySpells as Spell
 from demo.EnemyDropHandler import EnemyDropHandler
 from demo.Pickup import Pickup, LetterTile
+from demo.TurnManager import TurnManager
 from demo.Wall import Wall
 from lib import Math
 from lib.Animation import MoveAnimation, Spawn, InstantMoveAnimation
 from lib.GridEntity import GridEntity
 from lib.ImageHandler import ImageHandler
 from lib.Primitives import Pose
+from lib.RenderQueue import RenderQueue
 from lib.Settings import Settings
 from lib.Sprite import StaticSprite, InvisibleSprite
+from lib.TextHandler import TextHandler
 import math
 
-import random
+from lib.RandomStreams import RandomStreams
 import pygame
 
 
@@ -27,8 +30,8 @@ class Enemy(GridEntity):
     resistances = ()
     period = 1
 
-    name_font = None
-    name_letters = {}
+    NAME_FONT = "fonts/smallest_pixel.ttf"
+    NAME_FONT_SIZE = 10
 
     faction = GridEntity.FACTION_HOSTILE
 
@@ -39,10 +42,8 @@ class Enemy(GridEntity):
         self.solid = True
         self.health = self.hit_points
         self.stun = 0
+        self.stun_release_round = None  # Round a stun already delaying the next turn runs out; see TurnManager
         self.menacing = []
-        if not Enemy.name_font:
-            Enemy.name_font = pygame.font.Font("fonts/smallest_pixel.ttf", 10)
-            Enemy.name_letters = {letter:Enemy.name_font.render(letter, True, (255, 255, 255)) for letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ "}
         self.hearts = {
             0: ImageHandler.load("images/ui/small_health_0pip.png"),
             1: ImageHandler.load("images/ui/small_health_1pip.png"),
@@ -71,13 +72,10 @@ class Enemy(GridEntity):
             self.draw_highlight(surface, *square.get_position(), color=3, offset=offset)
 
     def draw_name(self, surface, offset=(0, 0)):
-        letters = [Enemy.name_letters[letter] for letter in self.name]
-        width = sum([letter.get_width() for letter in letters])
-        x = offset[0] - width//2 + self.position.x
-        y = offset[1] - letters[0].get_height()//2 + self.position.y + self.name_y_offset()
-        for letter in letters:
-            surface.blit(letter, (x, y))
-            x += letter.get_width()
+        word = TextHandler.word(Enemy.NAME_FONT, Enemy.NAME_FONT_SIZE, self.name, (255, 255, 255), antialias=True)
+        x = offset[0] - word.get_width()//2 + self.position.x
+        y = offset[1] - word.get_height()//2 + self.position.y + self.name_y_offset()
+        RenderQueue.blit(surface, word, (x, y))
         self.draw_health(surface, offset=offset)
 
     def draw_health(self, surface, offset=(0, 0)):
@@ -91,7 +89,7 @@ class Enemy(GridEntity):
             pips = min(health_remaining, 3)
             health_remaining -= pips
             surf = self.hearts[pips]
-            surface.blit(surf, (x - surf.get_width()//2, y - surf.get_width()//2))
+            RenderQueue.blit(surface, surf, (x - surf.get_width()//2, y - surf.get_width()//2))
             x += spacing
 
     def name_y_offset(self):
@@ -123,10 +121,11 @@ class Enemy(GridEntity):
             hp = 0
         if stun > 0 and damage_type in self.invulnerabilities:
             stun = 0
-        self.stun = max(self.stun, stun)
+        TurnManager.apply_stun(self, stun)
         self.health -= hp
         if self.health <= 0:
             self.health = 0
+            TurnManager.on_death(self)
 
     def on_destroy(self):
         super().on_destroy()
@@ -173,7 +172,7 @@ class Bat(Enemy):
     def __init__(self):
         super().__init__()
         self.attacks = [spell(self) for spell in self.spells]
-        self.stun += int(random.random()*self.period)
+        self.stun += int(RandomStreams.get(RandomStreams.AI).random()*self.period)
         self.current_spell = None
         self.current_target = None
         self.spell_progress = 0
@@ -211,7 +210,8 @@ class Bat(Enemy):
                 return
         hunt_target = Ai.select_target(self, targets=targets, radius=4, visible=True)
         if hunt_target:
-            destination = Ai.hunt(self, hunt_target, squares=self.move_squares)
+            field = TurnManager.distance_field_to(self.layer.map, (self.position_on_grid + hunt_target).get_position())
+            destination = Ai.hunt(self, hunt_target, squares=self.move_squares, field=field)
         else:
             destination = Ai.wander(self, self.move_squares)
         if destination:
@@ -333,16 +333,16 @@ class Slime(Bat):
 
     def on_move_to_grid_position(self, x, y, keep_turn=False):
         animation = InstantMoveAnimation if keep_turn else MoveAnimation
-        self.animations.append(animation(self,
-                                         self.position.copy(),
-                                         self.layer.grid_to_world_pixel(*self.position_on_grid.get_position()),
-                                         squish_factor=0.7, bounce_height=15))
+        self.add_animation(animation(self,
+                                     self.position.copy(),
+                                     self.layer.grid_to_world_pixel(*self.position_on_grid.get_position()),
+                                     squish_factor=0.7, bounce_height=15))
         self.check_for_pickups()
 
     def take_turn(self):
         if self.health < self.hit_points:
-            random.shuffle(self.move_squares)
-            for square in self.move_squares:
+            move_squares = RandomStreams.get(RandomStreams.AI).sample(self.move_squares, len(self.move_squares))
+            for square in move_squares:
                 if self.clone.cast(square):
                     self.stun += self.period - 1
                     self.hit_points = self.health
@@ -366,6 +366,7 @@ class GolemSummon(Enemy):
     faction = GridEntity.FACTION_ALLY
     drop_letters = False
     active_golems = []
+    PATH_BUDGET = 400  # Squares to search when following the player before falling back to greedy movement
 
     def __init__(self):
         super().__init__()
@@ -393,7 +394,12 @@ class GolemSummon(Enemy):
             return
         hunt_target = GridEntity.allies[0].position_on_grid - self.position_on_grid
         if hunt_target and hunt_target.magnitude() > 3:
-            destination = Ai.hunt(self, hunt_target)
+            path = self.layer.map.find_path(self.position_on_grid, GridEntity.allies[0].position_on_grid,
+                                            move_squares, budget=self.PATH_BUDGET)
+            if path:
+                destination = path[0] - self.position_on_grid
+            else:
+                destination = Ai.hunt(self, hunt_target)
         else:
             destination = Ai.wander(self, move_squares)
         if destination:
@@ -1,4 +1,4 @@
-import random
+from lib.RandomStreams import RandomStreams
 
 from lib import Math
 from lib.GridEntity import GridEntity
@@ -7,7 +7,7 @@ from lib.Primitives import Pose
 
 def wander(self, squares):
     """ Move in a random direction """
-    random.shuffle(squares)
+    squares = RandomStreams.get(RandomStreams.AI).sample(squares, len(squares))  # Leave shared lists in their order
     for square in squares:
         if self.can_move(*square.get_position()):
             return square
@@ -21,7 +21,7 @@ def select_target(self, targets, squares=None, radius=None, visible=False):
         if radius and target.magnitude() > radius:
             break
         if (not squares) or target in squares:#any([(target - square).magnitude() == 0 for square in squares]):
-            if not visible or self.layer.map.check_line_of_sight(target, self.position_on_grid):
+            if not visible or self.layer.map.check_line_of_sight(target, self.position_on_grid, radius=radius):
                 return target
     return None
 
@@ -43,14 +43,21 @@ def find(self, radius=1, factions=None, visible=True, squares=None):
     return square, entity
 
 
-def hunt(self, target, squares=None):
-    """ Move in direction of target, or return False if unable to move closer """
+def hunt(self, target, squares=None, field=None):
+    """
+    Move in direction of target, or return False if unable to move closer. If a distance field is given, prefer the
+    squares closest to its sources by walking distance, so walls are routed around rather than walked into.
+    """
     if not squares:
         squares = Math.get_squares_in_range(1, no_origin=True)
     squares = filter_moveable(self, squares)
     if not len(squares):
         return False
-    squares.sort(key=lambda s: (s-target).magnitude())
+    if field is not None:
+        x, y = self.position_on_grid.x, self.position_on_grid.y
+        squares.sort(key=lambda s: (field.get(x + s.x, y + s.y), (s-target).magnitude()))
+    else:
+        squares.sort(key=lambda s: (s-target).magnitude())
     return squares[0]
 
 
@@ -75,7 +82,7 @@ def check_spell(self, spell, targets, squares=None, can_melee=True, can_ranged=T
         squares = []
         if can_melee:
             squares += Math.get_squares(linear=1)
-            random.shuffle(squares)
+            RandomStreams.get(RandomStreams.AI).shuffle(squares)
         if can_ranged:
             squares += targets[:]
     for square in squares:
@@ -1,5 +1,5 @@
 from demo.Pickup import LetterTile, HealthPickupSmall
-import random
+from lib.RandomStreams import RandomStreams
 
 class EnemyDropHandler:
 
@@ -21,11 +21,12 @@ class EnemyDropHandler:
             cls.enemy_drops_so_far[key].append(new_tile)
             return new_tile
         else:
-            if random.random() < 0.05:
+            drops = RandomStreams.get(RandomStreams.DROPS)
+            if drops.random() < 0.05:
                 pip = HealthPickupSmall()
                 return pip
-            if random.random() < 0.1:
-                new_tile = LetterTile(random.choice(enemy.name))
+            if drops.random() < 0.1:
+                new_tile = LetterTile(drops.choice(enemy.name))
                 return new_tile
 
     @classmethod
@@ -2,12 +2,38 @@ from lib.ImageHandler import ImageHandler
 from lib.Primitives import GameObject, Pose
 import pygame
 from lib.Settings import Settings
+from lib.RenderQueue import RenderQueue
 import random
 import math
 
+# Kinds of particle a ParticleLayer simulates itself. Anything else is kept as an object and updated and drawn by
+# its own methods.
+KIND_OBJECT = 0
+KIND_CIRCLE = 1
+KIND_FWOOSH = 2
+KIND_SLASH = 3
+KIND_NAMES = {KIND_OBJECT: "object", KIND_CIRCLE: "circle", KIND_FWOOSH: "fwoosh", KIND_SLASH: "slash"}
+
+
 class ParticleHandler:
 
+    SLASH_FRAMES = 32  # Number of frames slash particles are pre-rendered at over their lifetime
+    FRAME_CACHE_SIZE = 1024  # Number of pre-rendered particle frames kept before the cache is cleared
+    CIRCLE_RADIUS_STEPS = 4  # Radii per pixel circle frames are pre-rendered at, which gives every drawn size a frame
+    CIRCLE_SHEET_CACHE_SIZE = 64  # Number of circle sprite sheets kept before the cache is cleared
+
+    LOD_START = 0.5  # Fraction of the budget or a quota in use past which effects start spawning fewer particles
+    QUOTAS = {  # Fraction of the budget each kind of particle can use at most
+        KIND_OBJECT: 1,
+        KIND_CIRCLE: 0.4,
+        KIND_FWOOSH: 0.3,
+        KIND_SLASH: 0.5,
+    }
+
     particles = {}
+    live = [0] * len(KIND_NAMES)  # Number of particles alive, by kind
+    _frames = {}
+    _circle_sheets = {}
 
     @classmethod
     def init(cls):
@@ -15,33 +41,351 @@ class ParticleHandler:
 
     @classmethod
     def update(cls, dt, events):
-        keys = cls.particles.keys()
-        for key in sorted(keys):
-            new_particles = []
-            for particle in cls.particles[key]:
-                particle.update(dt, events)
-                if not particle.destroyed:
-                    new_particles.append(particle)
-            cls.particles[key] = new_particles
+        for key in sorted(cls.particles.keys()):
+            cls.particles[key].update(dt, events)
 
     @classmethod
     def draw(cls, surface, offset=(0, 0)):
         for key in sorted(cls.particles.keys()):
-            for particle in cls.particles[key]:
-                particle.draw(surface, offset=offset)
+            cls.particles[key].draw(surface, offset)
 
     @classmethod
     def add_particle(cls, particle, layer=1):
-        if not layer in cls.particles:
-            cls.particles[layer] = []
-        cls.particles[layer].append(particle)
+        """
+        Adds a particle to a layer.
+        :param particle: The Particle
+        :param layer: The layer key. Layers are drawn in ascending order.
+        :return: False if the particle wasn't added because the particle budget or its kind's quota is used up
+        """
+        return cls.get_layer(layer).add_particle(particle)
+
+    @classmethod
+    def reserve(cls, kind):
+        """
+        Counts a new particle against the budget and its kind's quota, if there's room for it.
+        :param kind: The particle's kind
+        :return: True if the particle can be added
+        """
+        budget = Settings.Dynamic.PARTICLE_BUDGET
+        live = cls.live
+        if sum(live) >= budget or live[kind] >= cls.QUOTAS[kind] * budget:
+            return False
+        live[kind] += 1
+        return True
+
+    @classmethod
+    def spawn_rate(cls, kind):
+        """
+        Returns how much to scale the spawn rate of effects that make a kind of particle by. This drops from 1 toward 0
+        as the budget or the kind's quota fills up, so busy effects thin out instead of slowing the game down.
+        :param kind: The particle kind
+        :return: A multiplier from 0 to 1
+        """
+        budget = Settings.Dynamic.PARTICLE_BUDGET
+        if not budget:
+            return 0
+        load = max(sum(cls.live) / budget, cls.live[kind] / (cls.QUOTAS[kind] * budget))
+        if load <= cls.LOD_START:
+            return 1
+        return max(0, (1 - load) / (1 - cls.LOD_START))
+
+    @classmethod
+    def live_counts(cls):
+        """
+        Returns how many particles of each kind are alive, for profiling.
+        :return: Dictionary from kind name to count
+        """
+        return {name: cls.live[kind] for kind, name in KIND_NAMES.items()}
+
+    @classmethod
+    def get_layer(cls, layer):
+        """
+        Returns the particles on a layer, creating the layer if it doesn't exist yet.
+        :param layer: The layer key. Layers are drawn in ascending order.
+        :return: The ParticleLayer
+        """
+        if layer not in cls.particles:
+            cls.particles[layer] = ParticleLayer()
+        return cls.particles[layer]
 
     @classmethod
     def clear_particles(cls):
         cls.particles = {}
+        cls.live = [0] * len(KIND_NAMES)
+
+    @classmethod
+    def get_frame(cls, key, render):
+        """
+        Returns a pre-rendered particle frame, rendering it the first time it's asked for.
+        :param key: Hashable description of the frame
+        :param render: Function called with no arguments to render the frame if it isn't cached. It may return None
+            for frames with nothing to draw.
+        :return: The surface, or None
+        """
+        frames = cls._frames
+        if key in frames:
+            return frames[key]
+        if len(frames) >= cls.FRAME_CACHE_SIZE:
+            frames.clear()
+        frame = frames[key] = render()
+        return frame
+
+    @classmethod
+    def prewarm(cls, colors, radius=5):
+        """
+        Renders the circle sprite sheets for some colors ahead of time, so the first effect in them doesn't stall.
+        :param colors: Iterable of (r, g, b) colors
+        :param radius: Starting radius of the circles, in pixels
+        """
+        for color in colors:
+            cls.circle_sheet(tuple(color), radius)
+
+    @classmethod
+    def circle_sheet(cls, color, radius):
+        """
+        Returns the frames a circle particle shrinks through, rendering them the first time they're asked for.
+        :param color: The particle's color, as an (r, g, b) tuple
+        :param radius: The particle's starting radius, in pixels
+        :return: List of (glow, core) surfaces indexed by int(radius * CIRCLE_RADIUS_STEPS) for radii from 1 up
+        """
+        key = color, radius
+        sheet = cls._circle_sheets.get(key)
+        if sheet is not None:
+            return sheet
+
+        glow = ImageHandler.load("images/glow.png")
+        if color != (255, 255, 255):
+            glow = glow.copy()
+            tint = pygame.Surface(glow.get_size())
+            tint.fill(color)
+            glow.blit(tint, (0, 0), special_flags=pygame.BLEND_MULT)
+        core = pygame.Surface((2*radius, int(2*radius)))
+        core.fill((0, 0, 0))
+        pygame.draw.circle(core, tuple([(item + 255) // 2 for item in color]), (radius, radius), radius)
+        core.set_colorkey((255, 0, 255))
+
+        # Glows are drawn int(4 * radius) wide and cores int(2 * radius), so with four steps per pixel each frame
+        # matches exactly what scaling for the unquantized radius would give
+        steps = cls.CIRCLE_RADIUS_STEPS
+        sheet = [None] * (int(radius * steps) + 1)
+        cores = {}
+        for index in range(steps, len(sheet)):
+            glow_size = int(4 * index / steps)
+            core_size = int(2 * index / steps)
+            if core_size not in cores:
+                cores[core_size] = pygame.transform.scale(core, (core_size, core_size))
+            sheet[index] = pygame.transform.scale(glow, (glow_size, glow_size)), cores[core_size]
+
+        if len(cls._circle_sheets) >= cls.CIRCLE_SHEET_CACHE_SIZE:
+            cls._circle_sheets.clear()
+        cls._circle_sheets[key] = sheet
+        return sheet
+
+    @classmethod
+    def fwoosh_frame(cls, width, height):
+        """ A fwoosh particle's ellipse, scaled to a size in whole pixels """
+        def render():
+            surface = pygame.Surface((FwooshParticle.WIDTH, FwooshParticle.HEIGHT))
+            surface.fill((255, 0, 255))
+            pygame.draw.ellipse(surface, (255, 255, 255), (surface.get_rect()))
+            surface.set_colorkey((255, 0, 255))
+            return pygame.transform.scale(surface, (width, height))
+        return cls.get_frame(("fwoosh", width, height), render)
+
+    @classmethod
+    def slash_frame(cls, color, thickness, length, index):
+        """ A slash particle's scaled, rotated and faded surface partway through its life """
+        def render():
+            through = (index + 0.5) / cls.SLASH_FRAMES
+            scale = through * (1 - through)**2 * 4
+            width = int(length * scale)
+            height = int(thickness * scale)
+            if width <= 0 or height <= 0:
+                return None
+            surf = pygame.Surface((thickness, length))
+            surf.fill((255, 0, 255))
+            surf.set_colorkey((255, 0, 255))
+            pygame.draw.ellipse(surf, color, surf.get_rect())
+            surf = pygame.transform.scale(surf, (width, height))
+            # The direction a slash moves in depends only on how far through its life it is
+            angle = math.atan2(30 + 100*through, -100 + 50*through) * 180/math.pi + 90
+            surf = pygame.transform.rotate(surf, angle)
+            surf.set_alpha(255 * ((1 - through)**0.5))
+            return surf
+        return cls.get_frame(("slash", color, thickness, length, index), render)
+
+
+class ParticleLayer:
+    """
+    One layer of particles, stored as parallel lists (one entry per particle) rather than as an object each, so a
+    whole layer updates in a single loop without per-particle method calls or Pose math.
+    """
+
+    def __init__(self):
+        self.kinds = []
+        self.xs = []
+        self.ys = []
+        self.x_velocities = []
+        self.y_velocities = []
+        self.ages = []
+        self.durations = []
+        self.colors = []
+        self.params = []  # Per kind: (radius,) for circles, (thickness, length) for slashes, the object for objects
+        self.phases = []  # How far through its life a slash was as of its last update, which its shape follows
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, x, y, x_velocity, y_velocity, duration, color=(255, 255, 255), params=None):
+        """
+        Adds a particle of one of the simulated kinds.
+        :param kind: KIND_CIRCLE, KIND_FWOOSH or KIND_SLASH
+        :param x: Starting x position, in pixels
+        :param y: Starting y position, in pixels
+        :param x_velocity: Starting x velocity, in pixels per second
+        :param y_velocity: Starting y velocity, in pixels per second
+        :param duration: Lifetime, in seconds
+        :param color: Color, as an (r, g, b) tuple
+        :param params: Kind-specific parameters
+        :return: False if the particle wasn't added because the particle budget or its kind's quota is used up
+        """
+        if not ParticleHandler.reserve(kind):
+            return False
+        self.kinds.append(kind)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.x_velocities.append(x_velocity)
+        self.y_velocities.append(y_velocity)
+        self.ages.append(0)
+        self.durations.append(duration)
+        self.colors.append(color)
+        self.params.append(params)
+        self.phases.append(0)
+        return True
+
+    def add_particle(self, particle):
+        """
+        Adds a particle object, unpacking it into the layer's lists if it's one of the simulated kinds.
+        :param particle: The Particle
+        :return: False if the particle wasn't added because the particle budget or its kind's quota is used up
+        """
+        kind = getattr(particle, "kind", KIND_OBJECT)
+        if kind == KIND_OBJECT:
+            return self.add(KIND_OBJECT, 0, 0, 0, 0, 0, params=particle)
+        return self.add(kind, particle.position.x, particle.position.y, particle.velocity.x, particle.velocity.y,
+                 particle.duration, tuple(particle.color), particle.get_params())
+
+    def update(self, dt, events):
+        kinds = self.kinds
+        xs = self.xs
+        ys = self.ys
+        x_velocities = self.x_velocities
+        y_velocities = self.y_velocities
+        ages = self.ages
+        durations = self.durations
+        colors = self.colors
+        params = self.params
+        phases = self.phases
+        live = ParticleHandler.live
+        damping = 0.1**dt
+
+        # Survivors are packed down to the front of the lists in place, so their storage gets reused rather than
+        # reallocated every frame. Particles spawned while updating (e.g. the circles fwooshes leave behind) are
+        # appended to these same lists, and get updated later in this loop.
+        i = 0
+        kept = 0
+        while i < len(kinds):
+            kind = kinds[i]
+            x, y, x_velocity, y_velocity = xs[i], ys[i], x_velocities[i], y_velocities[i]
+            age, duration, phase = ages[i], durations[i], phases[i]
+            i += 1
+            if kind == KIND_OBJECT:
+                particle = params[i - 1]
+                particle.update(dt, events)
+                if particle.destroyed:
+                    live[kind] -= 1
+                    continue
+            else:
+                if kind == KIND_SLASH:
+                    phase = min(age/duration, 1)
+                    x_velocity = (-100 + 50*phase) * 2 * (1 - phase)
+                    y_velocity = (30 + 100*phase) * 2 * (1 - phase)
+                age += dt
+                x += x_velocity * dt
+                y += y_velocity * dt
+                if age/duration >= 1:
+                    live[kind] -= 1
+                    if kind == KIND_FWOOSH:
+                        self.on_fwoosh_destroyed(x, y, colors[i - 1])
+                    continue
+                if kind == KIND_CIRCLE:
+                    x_velocity *= damping
+                    y_velocity *= damping
+            kinds[kept] = kind
+            xs[kept] = x
+            ys[kept] = y
+            x_velocities[kept] = x_velocity
+            y_velocities[kept] = y_velocity
+            ages[kept] = age
+            durations[kept] = duration
+            colors[kept] = colors[i - 1]
+            params[kept] = params[i - 1]
+            phases[kept] = phase
+            kept += 1
+
+        for column in kinds, xs, ys, x_velocities, y_velocities, ages, durations, colors, params, phases:
+            del column[kept:]
+
+    @staticmethod
+    def on_fwoosh_destroyed(x, y, color):
+        duration = 0.6 * random.random() + 0.25
+        x_velocity = random.random() * 120 - 60
+        y_velocity = random.random() * 120 - 60
+        ParticleHandler.get_layer(1).add(KIND_CIRCLE, x, y, x_velocity, y_velocity, duration, color,
+                                         (FwooshParticle.CIRCLE_RADIUS,))
+
+    def draw(self, surface, offset=(0, 0)):
+        ox, oy = offset
+        slash_frames = ParticleHandler.SLASH_FRAMES
+        circle_steps = ParticleHandler.CIRCLE_RADIUS_STEPS
+        for kind, x, y, age, duration, color, params, phase in zip(self.kinds, self.xs, self.ys, self.ages,
+                                                                  self.durations, self.colors, self.params,
+                                                                  self.phases):
+            if kind == KIND_OBJECT:
+                params.draw(surface, offset=offset)
+                continue
+            through = min(age/duration, 1)
+            if kind == KIND_CIRCLE:
+                full_radius = params[0]
+                radius = full_radius * (1 - through)
+                if radius < 1:
+                    continue
+                glow, core = ParticleHandler.circle_sheet(color, full_radius)[int(radius * circle_steps)]
+                half = glow.get_width()//2
+                RenderQueue.blit(surface, glow, (x + ox - half, y + oy - half), special_flags=pygame.BLEND_ADD)
+                RenderQueue.blit(surface, core, (x - radius + ox, y - radius + oy), special_flags=pygame.BLEND_ADD)
+            elif kind == KIND_FWOOSH:
+                width = int(through * FwooshParticle.WIDTH)
+                height = int(through * FwooshParticle.HEIGHT)
+                if not width or not height:
+                    continue
+                RenderQueue.blit(surface, ParticleHandler.fwoosh_frame(width, height),
+                                 (x - FwooshParticle.WIDTH//2 + ox, y - FwooshParticle.HEIGHT//2 + oy))
+            elif kind == KIND_SLASH:
+                frame = ParticleHandler.slash_frame(color, *params, min(int(phase * slash_frames), slash_frames - 1))
+                if frame is None:
+                    continue
+                RenderQueue.blit(surface, frame, (ox + x - frame.get_width()//2, oy + y - frame.get_height()//2))
 
 
 class Particle:
+    """
+    A particle to hand to ParticleHandler.add_particle. Subclasses that don't set a kind are updated and drawn by
+    their own update and draw methods; the built-in kinds only describe how the particle starts.
+    """
+
+    kind = KIND_OBJECT
+
     def __init__(self, duration=0.5, position=(0, 0), velocity = (0, 0)):
         self.duration = duration
         self.position = Pose(position, 0)
@@ -68,95 +412,50 @@ class Particle:
     def on_destroy(self):
         pass
 
+    def get_params(self):
+        """
+        Returns the kind-specific parameters the particle is simulated with.
+        """
+        return None
+
 
 class CircleParticle(Particle):
 
+    kind = KIND_CIRCLE
+
     def __init__(self, duration=0.5, position=(0, 0), radius=5, color=(255, 255, 255), velocity = (0, 0)):
-        self.glow = ImageHandler.load_copy("images/glow.png")
-        if color != (255, 255, 255):
-            self.glow = self.glow.copy()
-            tint = pygame.Surface(self.glow.get_size())
-            tint.fill((color))
-            self.glow.blit(tint, (0, 0), special_flags=pygame.BLEND_MULT)
         super().__init__(duration=duration, position=position, velocity=velocity)
         self.radius = radius
-        surface = pygame.Surface((2*radius, int(2*radius)))
-        surface.fill((0, 0, 0))
-        r = radius
-        color = tuple([(item + 255) //  2 for item in color])
-        pygame.draw.circle(surface, color, (r, r), r)
-        surface.set_colorkey((255, 0, 255))
-        self.surface = surface
-
-    def draw(self, surface, offset=(0, 0)):
-        radius = self.radius * (1 - self.through())
-        if radius < 1:
-            return
-        x = self.position.x - radius + offset[0]
-        y = self.position.y - radius + offset[1]
-        # self.surface.set_alpha(255 * (1 - self.through()))
-        glow = pygame.transform.scale(self.glow, (int(4*radius), int(4*radius)))
-        surface.blit(glow, (self.position.x + offset[0] - glow.get_width()//2, self.position.y + offset[1] - glow.get_height()//2), special_flags=pygame.BLEND_ADD)
-        surface.blit(pygame.transform.scale(self.surface, (int(2*radius), int(2*radius))), (x, y), special_flags=pygame.BLEND_ADD)
+        self.color = color
 
-    def update(self, dt, events):
-        super().update(dt, events)
-        self.velocity *= 0.1**dt
+    def get_params(self):
+        return self.radius,
 
 
 class FwooshParticle(Particle):
+
+    kind = KIND_FWOOSH
+    WIDTH = 3
+    HEIGHT = 6
+    CIRCLE_RADIUS = 5  # Radius of the circle each one leaves behind
+
     def __init__(self, duration=0.5, parent_position = (0, 0), color=(255, 255, 255)):
         offset = Pose((random.random() * 20 - 10, -Settings.Static.TILE_SIZE + random.random() * 20), 0)
         position = Pose(parent_position, 0) + offset
         super().__init__(duration=duration, position=position.get_position(), velocity=(0, Settings.Static.TILE_SIZE/duration))
-        self.width = 3
-        self.height = 6
-        surface = pygame.Surface((self.width, self.height))
         self.color = color
-        surface.fill((255, 0, 255))
-        #self.color = color
-        pygame.draw.ellipse(surface, (255, 255, 255), (surface.get_rect()))
-        surface.set_colorkey((255, 0, 255))
-        self.surface = surface
 
-    def draw(self, surface, offset=(0, 0)):
-        width = int(self.through() * self.width)
-        height = int(self.through() * self.height)
-        if not width or not height:
-            return
-        x = self.position.x - self.width//2 + offset[0]
-        y = self.position.y - self.height//2 + offset[1]
-        surface.blit(pygame.transform.scale(self.surface, (width, height)), (x, y))
 
-    def on_destroy(self):
-        ParticleHandler.add_particle(CircleParticle(0.6 * random.random() + 0.25, self.position.get_position(), 5, self.color, (random.random() * 120 - 60, random.random() * 120 - 60)))
+class SlashParticle(Particle):
 
+    kind = KIND_SLASH
 
-class SlashParticle(Particle):
     def __init__(self, duration = 0.5, parent_position = (0, 0), color = (255, 255, 255), thickness = 6, length=8):
         position = Pose((parent_position), 0) + Pose((12, -12), 0)
         super().__init__(duration, position.get_position())
         self.color = color
-        surf = pygame.Surface((thickness, length))
-        surf.fill((255, 0, 255))
-        surf.set_colorkey((255, 0, 255))
-        pygame.draw.ellipse(surf, (color), surf.get_rect())
-        self.surf = surf
-        self.velocity = Pose((-50, 20))
-        self.scale = 0
+        self.thickness = thickness
+        self.length = length
 
-    def update(self, dt, events):
-        self.velocity = Pose((-100 + 50*self.through(), 30 + 100*self.through())) * 2
-        self.scale = self.through() * (1 - self.through())**2 * 4
-        self.velocity *= (1 - self.through())
-        super().update(dt, events)
-
-    def draw(self, surface, offset=(0, 0)):
-        if self.scale <= 0:
-            return
-        my_surf = pygame.transform.scale(self.surf, (int(self.surf.get_height()*self.scale), int(self.surf.get_width()*self.scale)))
-        my_surf = pygame.transform.rotate(my_surf, math.atan2(self.velocity.y, self.velocity.x) * 180/math.pi + 90)
-        x = offset[0] + self.position.x - my_surf.get_width()//2
-        y = offset[1] + self.position.y - my_surf.get_height()//2
-        my_surf.set_alpha(255 * ((1 - self.through())**0.5))
-        surface.blit(my_surf, (x, y))
\ No newline at end of file
+    def get_params(self):
+        return self.thickness, self.length
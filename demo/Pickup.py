@@ -27,7 +27,7 @@ class LetterTile(Pickup):
     def __init__(self, letter):
         super().__init__()
         self.letter = letter
-        self.add_sprite(StaticSprite(ImageHandler.load(f"images/letters/UI_LETTER_{letter}.png"), colorkey=(255, 0, 255)))
+        self.add_sprite(StaticSprite(ImageHandler.load(f"images/letters/UI_Letter_{letter}.png"), colorkey=(255, 0, 255)))
 
     def on_pickup(self, pickupper):
         super().on_pickup(pickupper)
@@ -1,13 +1,15 @@
-import random
+from lib.RandomStreams import RandomStreams
 
 from demo.Callout import CalloutManager
 from demo.ParticleHandler import ParticleHandler, CircleParticle
 from demo.Wall import Exit
+from demo.TurnManager import TurnManager
 from lib.Animation import Fwoosh, Feint, ShrinkToNothing, Spawn
 from demo.Pickup import LetterTile
 from lib.Camera import Camera
 from lib.GridEntity import GridEntity
 from lib.Primitives import Pose
+from lib.RenderQueue import RenderQueue
 from lib.Settings import Settings
 from lib.Sprite import StaticSprite
 import demo.Spell as Spell
@@ -71,7 +73,7 @@ class Player(GridEntity):
 
     def on_move_to_grid_position(self, x, y, keep_turn=False):
         super().on_move_to_grid_position(x, y, keep_turn)
-        for other in self.layer.map.get_all_at_position(x, y):
+        for other in self.layer.map.iter_all_at_position(x, y):
             if type(other) == Exit:
                 self.add_animation(ShrinkToNothing(self, 0.6))
         #self.animations.append(Fwoosh(self, 0.8))
@@ -165,7 +167,7 @@ class Player(GridEntity):
         sx = self.position.x + offset[0] + (14 * (1 - 2*should_flip)) - staff_rotated.get_width()//2
         sy = self.position.y + offset[1] - (5) - staff_rotated.get_height()//2
         if not self.shrinking:
-            surface.blit(staff_rotated, (sx, sy))
+            RenderQueue.blit(surface, staff_rotated, (sx, sy))
         super().draw(surface, offset=offset)
 
     def draw_targets(self, surface, offset=(0, 0)):
@@ -214,6 +216,7 @@ class Player(GridEntity):
         if self.health <= 0:
             self.health = 0
             self.game_over = True
+            TurnManager.on_death(self)
 
 
     def push(self, x=0, y=0, teleport=False, instant=False):
@@ -237,7 +240,7 @@ class Player(GridEntity):
     def check_for_pickups(self):
         if not self.position_on_grid:
             return
-        for entity in self.layer.map.get_all_at_position(*self.position_on_grid.get_position()):
+        for entity in self.layer.map.iter_all_at_position(*self.position_on_grid.get_position()):
             if entity is self:
                 pass
             if entity.is_pickup:
@@ -252,7 +255,7 @@ class Player(GridEntity):
         if not unknown_spells:
             CalloutManager.post_message(CalloutManager.LOST_PAGE, "Nothing", "All the dungeon's secrets are known to you already.")
             return
-        random.shuffle(unknown_spells)
+        RandomStreams.get(RandomStreams.DROPS).shuffle(unknown_spells)
         letters = self.get_letters()
         unknown_spells.sort(key=lambda s: self.score_spell(s, letters))
         new_spell = unknown_spells[0]
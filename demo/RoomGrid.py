@@ -0,0 +1,129 @@
+class RoomGrid:
+    """
+    Tracks which cells of the level's room layout are taken, as one integer bitmask, and finds every position a room
+    could go.
+
+    Cell (x, y) is bit x * height + y, so a room is a run of its height in bits repeated once per column.
+    """
+
+    footprint_cache = {}  # Footprint masks by (grid height, x, y, width, height)
+    path_offset_cache = {}
+    neighbour_offset_cache = {}
+
+    def __init__(self, width, height):
+        """
+        Initializes an empty grid.
+        :param width: The grid's width, in rooms
+        :param height: The grid's height, in rooms
+        """
+        self.width = width
+        self.height = height
+        self.occupied = 0
+
+    def footprint(self, x, y, width, height):
+        """
+        Returns the bitmask of the cells a room would cover. The room must be in bounds.
+        :param x: The room's left column
+        :param y: The room's top row
+        :param width: The room's width, in rooms
+        :param height: The room's height, in rooms
+        :return: The bitmask
+        """
+        key = self.height, x, y, width, height
+        mask = RoomGrid.footprint_cache.get(key)
+        if mask is None:
+            column = ((1 << height) - 1) << (x * self.height + y)
+            mask = 0
+            for i in range(width):
+                mask |= column << (i * self.height)
+            RoomGrid.footprint_cache[key] = mask
+        return mask
+
+    def in_bounds(self, x, y, width=1, height=1):
+        """ Whether a room would be entirely inside the grid """
+        return 0 <= x and 0 <= y and x + width <= self.width and y + height <= self.height
+
+    def is_occupied(self, x, y):
+        """
+        Checks whether a cell is taken.
+        :param x: The cell's column
+        :param y: The cell's row
+        :return: True if there's a room there; cells outside the grid never have one
+        """
+        return self.in_bounds(x, y) and bool(self.occupied >> (x * self.height + y) & 1)
+
+    def fits(self, x, y, width, height):
+        """
+        Checks whether a room could go somewhere.
+        :param x: The room's left column
+        :param y: The room's top row
+        :param width: The room's width, in rooms
+        :param height: The room's height, in rooms
+        :return: True if the room is entirely inside the grid and overlaps no other room
+        """
+        return self.in_bounds(x, y, width, height) and not self.occupied & self.footprint(x, y, width, height)
+
+    def place(self, x, y, width, height):
+        """
+        Marks the cells a room covers as taken.
+        :param x: The room's left column
+        :param y: The room's top row
+        :param width: The room's width, in rooms
+        :param height: The room's height, in rooms
+        """
+        self.occupied |= self.footprint(x, y, width, height)
+
+    def anchors(self, x, y, width, height, offsets):
+        """
+        Finds every position a room could go among some offsets from a cell.
+        :param x: The column offsets are measured from
+        :param y: The row offsets are measured from
+        :param width: The room's width, in rooms
+        :param height: The room's height, in rooms
+        :param offsets: The (dx, dy) offsets of the room's top left cell to try
+        :return: List of (x, y) positions where the room fits, in the order of offsets
+        """
+        return [(x + dx, y + dy) for dx, dy in offsets if self.fits(x + dx, y + dy, width, height)]
+
+    def as_lists(self):
+        """
+        Returns the grid as nested lists of booleans, indexed [x][y]
+        """
+        return [[self.is_occupied(x, y) for y in range(self.height)] for x in range(self.width)]
+
+    @staticmethod
+    def path_offsets(width, height):
+        """
+        Offsets at which a room continues a path from a cell: touching it along a side, and not diagonally.
+        :param width: The room's width, in rooms
+        :param height: The room's height, in rooms
+        :return: List of (dx, dy) offsets of the room's top left cell
+        """
+        key = width, height
+        offsets = RoomGrid.path_offset_cache.get(key)
+        if offsets is None:
+            offsets = RoomGrid.path_offset_cache[key] = [
+                (dx, dy) for dx in range(-width, 2) for dy in range(-height, 2)
+                if not (dx == 0 and dy == 0)
+                and not (abs(dx) == width and abs(dy) == height)
+                and (-width < dx <= 0 or -height < dy <= 0)
+            ]
+        return offsets
+
+    @staticmethod
+    def neighbour_offsets(width, height):
+        """
+        Offsets at which a room lands near a cell, for rooms branching off the main path.
+        :param width: The room's width, in rooms
+        :param height: The room's height, in rooms
+        :return: List of (dx, dy) offsets of the room's top left cell
+        """
+        key = width, height
+        offsets = RoomGrid.neighbour_offset_cache.get(key)
+        if offsets is None:
+            offsets = RoomGrid.neighbour_offset_cache[key] = [
+                (dx, dy) for dx in range(-width, width + 1) for dy in range(-height, height + 1)
+                if not (dx == 0 and dy == 0)
+                and not (abs(dx) == width and abs(dy) == height)
+            ]
+        return offsets
@@ -0,0 +1,188 @@
+"""
+Keeps every room layout in one binary bundle, so levels can be generated without parsing YAML.
+
+The bundle is rebuilt from the YAML sources whenever they change, but it can also be built ahead of time:
+
+    python -m demo.RoomLibrary
+"""
+import hashlib
+import os
+import struct
+import tempfile
+
+import yaml
+
+
+class RoomLibrary:
+    """
+    Static class holding the room layouts, loaded once per process.
+
+    Rooms are dictionaries like the YAML files they come from, with "width" and "height" in room units and "tiles"
+    as a list of strings. They're named by their path under rooms/ without the extension, like
+    "special_rooms/exit_room". Don't modify them; they're shared by every level.
+    """
+
+    SOURCE_DIRECTORIES = ("rooms/small_rooms", "rooms/special_rooms")
+    BUNDLE_PATH = "rooms/rooms.bin"
+    MAGIC = b"ROOMLIB1"
+
+    # Bundle layout: magic, sha256 of the sources, number of rooms, then per room a header followed by its name and
+    # its tiles row after row
+    HEADER = struct.Struct("<8s32sI")
+    ROOM_HEADER = struct.Struct("<HBBHH")  # Name length, width, height, tile columns, tile rows
+
+    rooms = None
+
+    @classmethod
+    def load(cls):
+        """
+        Loads the rooms, from the bundle if it's up to date and from the YAML sources (rebuilding the bundle)
+        otherwise. Does nothing if they're already loaded.
+        """
+        if cls.rooms is not None:
+            return
+        sources = cls.source_paths()
+        digest = cls.source_hash(sources)
+        rooms = cls.read_bundle(cls.BUNDLE_PATH, digest)
+        if rooms is None:
+            rooms = cls.build(sources, digest)
+        cls.rooms = rooms
+
+    @classmethod
+    def get(cls, name):
+        """
+        Returns a room.
+        :param name: The room's path under rooms/ without the extension, like "special_rooms/spawn_room"
+        :return: The room
+        """
+        cls.load()
+        return cls.rooms[name]
+
+    @classmethod
+    def small_rooms(cls):
+        """
+        Returns the rooms levels are built out of, in order of name.
+        :return: List of rooms
+        """
+        cls.load()
+        return [room for name, room in sorted(cls.rooms.items()) if name.startswith("small_rooms/")]
+
+    @classmethod
+    def source_paths(cls):
+        """
+        Lists the YAML files rooms are loaded from.
+        :return: Sorted list of paths
+        """
+        paths = []
+        for directory in cls.SOURCE_DIRECTORIES:
+            paths += [f"{directory}/{name}" for name in os.listdir(directory) if name.endswith(".yaml")]
+        return sorted(paths)
+
+    @staticmethod
+    def source_hash(paths):
+        """
+        Hashes the names and contents of the YAML sources, so a bundle built from different ones can be detected.
+        :param paths: The source paths
+        :return: The sha256 digest
+        """
+        digest = hashlib.sha256()
+        for path in paths:
+            with open(path, "rb") as file:
+                data = file.read()
+            digest.update(path.encode())
+            digest.update(struct.pack("<I", len(data)))
+            digest.update(data)
+        return digest.digest()
+
+    @staticmethod
+    def room_name(path):
+        """ The name of the room loaded from a path """
+        return os.path.splitext(path[len("rooms/"):])[0]
+
+    @classmethod
+    def build(cls, sources=None, digest=None):
+        """
+        Parses the YAML sources and writes them to the bundle.
+        :param sources: The source paths. By default, all of them.
+        :param digest: The sources' hash, if already known
+        :return: Dictionary of rooms by name
+        """
+        if sources is None:
+            sources = cls.source_paths()
+        if digest is None:
+            digest = cls.source_hash(sources)
+        rooms = {}
+        for path in sources:
+            with open(path) as file:
+                room = yaml.safe_load(file)
+            rooms[cls.room_name(path)] = {"width": room["width"], "height": room["height"], "tiles": room["tiles"]}
+        # Write beside the bundle and swap it in, so a process reading it never sees a half-written file
+        temporary_path = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(cls.BUNDLE_PATH), delete=False) as file:
+                temporary_path = file.name
+                file.write(cls.pack(rooms, digest))
+            os.replace(temporary_path, cls.BUNDLE_PATH)
+        except OSError:
+            # Read-only install; parse the sources again next time
+            if temporary_path is not None and os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return rooms
+
+    @classmethod
+    def pack(cls, rooms, digest):
+        """
+        Serializes rooms into the bundle format.
+        :param rooms: Dictionary of rooms by name
+        :param digest: The hash of the sources they came from
+        :return: The bundle's bytes
+        """
+        parts = [cls.HEADER.pack(cls.MAGIC, digest, len(rooms))]
+        for name, room in sorted(rooms.items()):
+            encoded_name = name.encode()
+            tiles = room["tiles"]
+            parts.append(cls.ROOM_HEADER.pack(len(encoded_name), room["width"], room["height"], len(tiles[0]),
+                                              len(tiles)))
+            parts.append(encoded_name)
+            parts += [row.encode("ascii") for row in tiles]
+        return b"".join(parts)
+
+    @classmethod
+    def read_bundle(cls, path, digest):
+        """
+        Reads rooms from a bundle.
+        :param path: The bundle's path
+        :param digest: The hash of the current sources
+        :return: Dictionary of rooms by name, or None if the bundle is missing, damaged or out of date
+        """
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            magic, bundle_digest, count = cls.HEADER.unpack_from(data)
+            if magic != cls.MAGIC or bundle_digest != digest:
+                return None
+            rooms = {}
+            position = cls.HEADER.size
+            for _ in range(count):
+                name_length, width, height, columns, rows = cls.ROOM_HEADER.unpack_from(data, position)
+                position += cls.ROOM_HEADER.size
+                name = data[position:position + name_length].decode()
+                position += name_length
+                tiles = [data[position + row * columns:position + (row + 1) * columns].decode("ascii")
+                         for row in range(rows)]
+                position += rows * columns
+                rooms[name] = {"width": width, "height": height, "tiles": tiles}
+            if position != len(data):
+                return None
+            return rooms
+        except (OSError, struct.error, UnicodeDecodeError):
+            return None
+
+
+def main():
+    rooms = RoomLibrary.build()
+    print(f"Wrote {len(rooms)} rooms to {RoomLibrary.BUNDLE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Runs levels without a window, stepping the turn system as fast as possible with a scripted player.
+
+    python -m demo.Simulation --levels 1-50 --turns 300 --policy zap
+"""
+import os
+
+# Must be set before pygame initializes, so nothing opens a window or an audio device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import random
+import time
+
+import pygame
+
+import demo.EnemyAI as Ai
+from demo.Callout import CalloutManager
+from demo.Demo1 import Game
+from demo.Enemy import Enemy
+from demo.EnemyDropHandler import EnemyDropHandler
+from demo.ParticleHandler import ParticleHandler
+from demo.Player import Player
+from demo.TurnManager import TurnManager
+from lib.Camera import Camera
+from lib.GridEntity import GridEntity
+from lib.ImageHandler import ImageHandler
+from lib.RandomStreams import RandomStreams
+from lib.Settings import Settings
+
+
+def random_walk(game, player):
+    """ Step in a random cardinal direction, or wait if that square is blocked """
+    player.move(*random.choice(((1, 0), (-1, 0), (0, 1), (0, -1))))
+
+
+def zap(game, player):
+    """ Zap an adjacent enemy when the spell is ready, otherwise walk randomly """
+    spell = player.spells[HeadlessGame.ZAP_SLOT]
+    if spell and not player.cooldown[HeadlessGame.ZAP_SLOT]:
+        target, _ = Ai.find(player, radius=1.5)
+        if target and spell.cast(target):
+            player.cooldown[HeadlessGame.ZAP_SLOT] = len(spell.get_name()) + 1
+            return
+    random_walk(game, player)
+
+
+POLICIES = {
+    "random": random_walk,
+    "zap": zap,
+}
+
+
+class HeadlessGame(Game):
+
+    ANIMATION_DT = 60  # Seconds to advance animations by each step, which finishes any of them at once
+    ZAP_SLOT = 1  # Spell slot the player starts with Zap in
+
+    def __init__(self, policy=random_walk):
+        """
+        Creates a game that plays itself without drawing anything.
+        :param policy: Function called with (game, player) whenever it is the player's turn. It should make the
+            player act; the turn is ended afterward.
+        """
+        pygame.init()
+        pygame.display.set_mode((1, 1))  # Images still need a display mode to convert to
+        EnemyDropHandler.init()
+        ImageHandler.init()
+        CalloutManager.init()
+        Camera.init()
+        self.policy = policy
+        self.proceed_to_next_level = False
+        self.on_run_start()
+
+    def run_level(self, level, max_turns=500):
+        """
+        Plays one level until the player dies, leaves it, or has taken enough turns.
+        :param level: Dungeon level to generate
+        :param max_turns: Number of player turns to stop after
+        :return: Dictionary of statistics about the run
+        """
+        self.current_dungeon_level = level
+        TurnManager.init()
+        ParticleHandler.init()
+        GridEntity.allies = []
+
+        map = self.generate_map()
+        player = Player()
+        map.add_to_cell(player, 7 + Settings.Static.ROOM_WIDTH * Settings.Static.MAP_WIDTH//2,
+                        7 + Settings.Static.ROOM_HEIGHT * Settings.Static.MAP_HEIGHT//2, 0)
+        enemies = self.spawn_enemies(map.get_layer(0), player)
+        TurnManager.add_entities(player)
+
+        player_turns = 0
+        last_round = TurnManager.round
+        start = time.time()
+        while player_turns < max_turns and not TurnManager.game_over and not player.advanced:
+            self.activate_creatures(map)
+            TurnManager.take_next_turn()
+            if player.taking_turn:
+                if player.new_turn:
+                    player.new_turn = False
+                    player.recharge()
+                self.policy(self, player)
+                player.end_turn()
+                player_turns += 1
+            self.finish_animations()
+            if TurnManager.round != last_round:
+                # Animations that don't hold the turn only need clearing out now and then
+                self.finish_animations(TurnManager.entities)
+                last_round = TurnManager.round
+        elapsed = time.time() - start
+
+        return {
+            "level": level,
+            "enemies": len(enemies),
+            "alive": sum(enemy.health > 0 for enemy in enemies),
+            "player_turns": player_turns,
+            "actions": TurnManager.actions,
+            "rounds": TurnManager.round,
+            "seconds": elapsed,
+            "game_over": TurnManager.game_over,
+        }
+
+    @staticmethod
+    def activate_creatures(map):
+        """
+        Registers every creature on the map with the turn system. In the game this only happens as they come into
+        view, which would leave most of the level idle here.
+        """
+        for cell in map.get_layer(0).populated_cells():
+            for game_object in cell:
+                if (game_object.is_player or isinstance(game_object, Enemy)) and not TurnManager.contains(game_object):
+                    TurnManager.add_entities(game_object)
+
+    def finish_animations(self, entities=None):
+        """
+        Plays out animations at once, including any they start when they finish.
+        :param entities: Entities to finish the animations of. By default, those that could be holding the turn.
+        """
+        entities = list(entities) if entities is not None else list(GridEntity.turn_holders)
+        while entities:
+            for entity in entities:
+                for animation in entity.animations[:]:
+                    animation.update(self.ANIMATION_DT, [])
+                    if animation.destroyed:
+                        entity.animations.remove(animation)
+            entities = [entity for entity in entities if entity.animations and not entity.destroyed]
+        ParticleHandler.update(self.ANIMATION_DT, [])
+
+
+def parse_levels(text):
+    """ Parses "3" or "1-50" into a range of levels """
+    if "-" in text:
+        first, last = text.split("-")
+        return range(int(first), int(last) + 1)
+    return range(int(text), int(text) + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play levels headlessly and report turn throughput.")
+    parser.add_argument("--levels", default="1-50", help="Level or range of levels to play, like 7 or 1-50")
+    parser.add_argument("--turns", type=int, default=300, help="Player turns to play per level")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="zap", help="How the player acts")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Run seed, which replays the same levels and turns. By default, a new random one.")
+    args = parser.parse_args()
+
+    seed = RandomStreams.seed_run(args.seed)
+    print(f"seed {seed}")
+    game = HeadlessGame(POLICIES[args.policy])
+    total_actions = 0
+    total_seconds = 0
+    for level in parse_levels(args.levels):
+        game.on_run_start(seed)
+        random.seed(RandomStreams.derive(seed, "policy", level))  # So each level plays the same wherever it starts
+        stats = game.run_level(level, args.turns)
+        total_actions += stats["actions"]
+        total_seconds += stats["seconds"]
+        rate = stats["actions"] / stats["seconds"] if stats["seconds"] else 0
+        print(f"level {stats['level']:>2}: {stats['enemies']:>3} enemies, {stats['alive']:>3} alive, "
+              f"{stats['player_turns']:>4} player turns, {stats['actions']:>6} actions, "
+              f"{rate:>8.0f} turns/sec{', game over' if stats['game_over'] else ''}")
+    if total_seconds:
+        print(f"total: {total_actions} actions in {total_seconds:.2f}s, {total_actions / total_seconds:.0f} turns/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -119,7 +119,7 @@ class Spell:
         tile = target + self.caster_pos()
         valid = False
         valid_density = False
-        for item in self.caster.layer.map.get_all_at_position(tile.x, tile.y):
+        for item in self.caster.layer.map.iter_all_at_position(tile.x, tile.y):
             if not len(affected) or item.faction in affected:
                 valid = True
             if item.faction in avoid:
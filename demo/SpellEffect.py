@@ -5,6 +5,16 @@ from lib.Settings import Settings
 
 
 class SpellEffect:
+
+    # Color of the fwoosh drawn on each square a damaging spell hits, by damage type
+    FWOOSH_COLORS = {
+        GridEntity.DAMAGE_SPELL: (0, 0, 255),
+        GridEntity.DAMAGE_FIRE: (255, 0, 0),
+        GridEntity.DAMAGE_DEMON: (100, 0, 0),
+        GridEntity.DAMAGE_WEB: (50, 50, 50),
+    }
+    DEFAULT_FWOOSH_COLOR = (0, 0, 255)
+
     def __init__(self, damage=0, damage_type=GridEntity.DAMAGE_SPELL, move_linear=None, move_radial=None, teleport=False,
                  stun=0, affected=(GridEntity.FACTION_ALLY, GridEntity.FACTION_HOSTILE, GridEntity.FACTION_NEUTRAL),
                  action=None, delayed_action=None, duration=0, summon=None, summon_args=None, menace=None,
@@ -51,40 +61,35 @@ class SpellEffect:
         # TODO (low priority): sort squares by distance from origin to avoid collisions when pushing
         for square in target.squares:
             tile = square + caster.position_on_grid
-            items = caster.layer.map.get_all_at_position(tile.x, tile.y)
-            if not items:
+            if not caster.layer.map.cell_populated(tile.x, tile.y):
                 continue
             summoned = False
             position = caster.position + square * Settings.Static.TILE_SIZE
             if self.damage and self.damage_type == GridEntity.DAMAGE_PHYSICAL:
                 caster.add_animation(Scratch(caster, 0.3, position.get_position(), color=(255, 255, 255)))
-            elif self.damage and self.damage_type == GridEntity.DAMAGE_SPELL:
-                caster.add_animation(Fwoosh(caster, 0.5, position.get_position(), (0, 0, 255)))
-            elif self.damage and self.damage_type == GridEntity.DAMAGE_FIRE:
-                caster.add_animation(Fwoosh(caster, 0.5, position.get_position(), (255, 0, 0)))
-            elif self.damage and self.damage_type == GridEntity.DAMAGE_DEMON:
-                caster.add_animation(Fwoosh(caster, 0.5, position.get_position(), (100, 0, 0)))
-            elif self.damage and self.damage_type == GridEntity.DAMAGE_WEB:
-                caster.add_animation(Fwoosh(caster, 0.5, position.get_position(), (50, 50, 50)))
+            elif self.damage and self.damage_type in self.FWOOSH_COLORS:
+                caster.add_animation(Fwoosh(caster, 0.5, position.get_position(), self.FWOOSH_COLORS[self.damage_type]))
             elif self.damage_type:
-                caster.add_animation(Fwoosh(caster, 0.5, position.get_position(), (0, 0, 255)))
+                caster.add_animation(Fwoosh(caster, 0.5, position.get_position(), self.DEFAULT_FWOOSH_COLOR))
+            # Copy only the matching objects, since pushes and summons move things in and out of the cell
+            items = [item for item in caster.layer.map.iter_all_at_position(tile.x, tile.y)
+                     if item.faction in self.affected and item.density in self.density]
             for item in items:
-                if item.faction in self.affected and item.density in self.density:
-                    if self.damage or self.stun:
-                        item.damage(hp=self.damage, damage_type=self.damage_type, stun=self.stun)
-                    if self.move_linear:
-                        item.push(self.move_linear.x, self.move_linear.y, teleport=self.teleport, instant=True)
-                    if self.move_radial:
-                        move = (item.position_on_grid - caster.position_on_grid - target.origin)
-                        if move.magnitude():
-                            move.scale_to(self.move_radial)
-                            item.push(round(move.x), round(move.y), teleport=self.teleport)
-                    if self.summon and not summoned:
-                        entity = self.summon(**self.summon_args)
-                        caster.layer.add_to_cell(entity, item.position_on_grid.x, item.position_on_grid.y)
-                        # TurnManager.add_entities(entity)
-                        summoned = True
-                    if self.action:
-                        self.action(self, item)
+                if self.damage or self.stun:
+                    item.damage(hp=self.damage, damage_type=self.damage_type, stun=self.stun)
+                if self.move_linear:
+                    item.push(self.move_linear.x, self.move_linear.y, teleport=self.teleport, instant=True)
+                if self.move_radial:
+                    move = (item.position_on_grid - caster.position_on_grid - target.origin)
+                    if move.magnitude():
+                        move.scale_to(self.move_radial)
+                        item.push(round(move.x), round(move.y), teleport=self.teleport)
+                if self.summon and not summoned:
+                    entity = self.summon(**self.summon_args)
+                    caster.layer.add_to_cell(entity, item.position_on_grid.x, item.position_on_grid.y)
+                    # TurnManager.add_entities(entity)
+                    summoned = True
+                if self.action:
+                    self.action(self, item)
             if self.menace:
                 caster.menacing += target.squares
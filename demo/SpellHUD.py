@@ -8,11 +8,19 @@ import time
 
 from lib.Settings import Settings
 from lib.Math import lerp, PowerCurve
-
-LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz 1234567890"
+from lib.RenderQueue import RenderQueue
+from lib.TextHandler import TextHandler
 
 class SpellHUD:
 
+    FONT = "fonts/pixantiqua.ttf"
+    FONT_SIZE = 12
+    # TODO use colors from the pallette
+    CHARGING_COLOR = (191, 111, 74)
+    CHARGED_COLOR = (48, 3, 217)
+    READY_COLOR = (0, 0, 0)
+    INDEX_COLOR = (255, 255, 255)
+
     def __init__(self, player):
         """
         UI for drawing the player's spells and cooldowns
@@ -20,12 +28,7 @@ class SpellHUD:
         """
         self.player = player
 
-        self.charging_font = pygame.font.Font("fonts/pixantiqua.ttf", 12)
-        # TODO use colors from the pallette
-        self.charging_letters = {letter: self.charging_font.render(letter, 0, (191, 111, 74)) for letter in LETTERS}
-        self.charged_letters = {letter: self.charging_font.render(letter, 0, (48, 3, 217)) for letter in LETTERS}
-        self.ready_letters = {letter: self.charging_font.render(letter, 0, (0, 0, 0)) for letter in LETTERS}
-        self.index_letters = {letter: self.charging_font.render(letter, 0, (255, 255, 255)) for letter in LETTERS}
+        self.ready_letters = TextHandler.glyphs(self.FONT, self.FONT_SIZE, self.READY_COLOR)
 
         button_surf = ImageHandler.load("images/ui/UI_Btn_Uncraft_Up.png")
         button_hover = ImageHandler.load("images/ui/UI_Btn_Uncraft_Hover.png")
@@ -61,7 +64,7 @@ class SpellHUD:
             pips = min(health_remaining, 3)
             health_remaining -= pips
             surf = self.hearts[pips]
-            surface.blit(surf, (x - surf.get_width()//2, y - surf.get_width()//2))
+            RenderQueue.blit(surface, surf, (x - surf.get_width()//2, y - surf.get_width()//2))
             x += spacing
 
     def update(self, dt, events):
@@ -91,14 +94,18 @@ class SpellHUD:
             return
 
         index = self.get_spells().index(spell)
-        index_letters = [self.index_letters[letter] for letter in str(index)]
+        index_word = TextHandler.word(self.FONT, self.FONT_SIZE, str(index), self.INDEX_COLOR)
 
+        name = spell.get_name().capitalize()
         if cooldown == 0:
-            letters = [self.ready_letters[letter] for letter in spell.get_name().capitalize()]
+            # Ready spells wiggle a letter at a time
+            letters = [self.ready_letters[letter] for letter in name]
+            word_width = sum([letter.get_width() for letter in letters])
         else:
-            charging_letters = [self.charging_letters[letter] for letter in spell.get_name().capitalize()]
-            charged_letters = [self.charged_letters[letter] for letter in spell.get_name().capitalize()]
-            letters = charged_letters[:-cooldown] + charging_letters[-cooldown:]
+            charged = max(len(name) - cooldown, 0)
+            colors = [self.CHARGED_COLOR] * charged + [self.CHARGING_COLOR] * (len(name) - charged)
+            word = TextHandler.word(self.FONT, self.FONT_SIZE, name, colors)
+            word_width = word.get_width()
 
         shown = lerp(0, 1, Settings.Dynamic.MENU_SHOWN, PowerCurve(0.5, 0.5, 2))
 
@@ -111,26 +118,24 @@ class SpellHUD:
         if shown > 0:
             button.x = x - 40
             button.y = y + 8
+            RenderQueue.flush()  # Buttons draw themselves directly
             button.draw(surface)
 
 
         if spell is self.player.get_spell():
-            surface.blit(self.glow, (x - 32 - self.glow.get_width()//2 + self.scroll.get_width()//2, y - 10 - self.glow.get_height()//2 + self.scroll.get_height()//2), special_flags=pygame.BLEND_ADD)
-        surface.blit(self.scroll, (x - 32, y - 10))
+            RenderQueue.blit(surface, self.glow, (x - 32 - self.glow.get_width()//2 + self.scroll.get_width()//2, y - 10 - self.glow.get_height()//2 + self.scroll.get_height()//2), special_flags=pygame.BLEND_ADD)
+        RenderQueue.blit(surface, self.scroll, (x - 32, y - 10))
 
-        index_width = sum([letter.get_width() for letter in index_letters])
-        xi, yi = x - index_width//2 - 7, y
-        for letter in index_letters:
-            surface.blit(letter, (xi, yi))
-            xi += letter.get_width()
+        RenderQueue.blit(surface, index_word, (x - index_word.get_width()//2 - 7, y))
 
-        word_width = sum([letter.get_width() for letter in letters])
         offset = 35 - word_width//2
         x += offset
 
-
+        if cooldown != 0:
+            RenderQueue.blit(surface, word, (x, y + 2))
+            return
         for letter in letters:
-            surface.blit(letter, (x, y + 2 + (cooldown == 0) * math.sin(time.time() * 10 - x) * 1))
+            RenderQueue.blit(surface, letter, (x, y + 2 + math.sin(time.time() * 10 - x) * 1))
             x += letter.get_width()
 
 
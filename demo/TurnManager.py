@@ -1,54 +1,173 @@
 from lib.Animation import DelayAnimation
+from lib.GridEntity import GridEntity
+
+import heapq
 
 
 class TurnManager:
 
-    entities = None
-    next_entity_turn = 0
+    DISTANCE_FIELD_LIMIT = 20  # How many steps away from their target hunting enemies can follow a distance field
+    DISTANCE_FIELD_CACHE_SIZE = 16  # Number of distance fields kept before they are all rebuilt
+
+    entities = None  # Ordered registry mapping each entity taking turns to its place in the turn order
+    round = 0  # The scheduler's clock; every entity acts at most once per round unless it combos
+    actions = 0  # Number of turns taken, including skipped ones, since init
+    game_over = False
+
+    _queue = None  # Heap of (round, order, entity) entries; entries whose order is stale are skipped
+    _next_order = 0
+    _dead = None  # Entities whose health has dropped to zero since the last turn
+
+    _distance_fields = None  # Distance fields by the square they lead to
+    _distance_fields_key = None  # The map and wall version those fields were built for
 
     @classmethod
     def init(cls, initial_entities=None):
-        cls.entities = initial_entities if initial_entities else []
-        cls.next_entity_turn = 0
+        cls.entities = {}
+        cls.round = 0
+        cls.actions = 0
+        cls.game_over = False
+        cls._queue = []
+        cls._next_order = 0
+        cls._dead = []
+        GridEntity.turn_holders.clear()
+        cls._distance_fields = {}
+        cls._distance_fields_key = None
+        if initial_entities:
+            cls.add_entities(*initial_entities)
 
     @classmethod
     def take_next_turn(cls):
-        game_over = False
-        while not any([entity.taking_turn or entity.keep_turn() for entity in cls.entities]):
-            for entity in cls.entities[:]:
-                if entity.health <= 0:
-                    if entity.is_player and entity.game_over:
-                        game_over = True
-                    entity.destroy()
-            if game_over:
+        """
+        Lets entities act in turn order until one of them needs to wait on the player or an animation.
+        """
+        while not cls.game_over and not cls._turn_held():
+            cls._clear_dead()
+            if cls.game_over or not cls._queue:
                 break
-            if cls.entities[cls.next_entity_turn].health > 0:
-                if cls.entities[cls.next_entity_turn].stun > 0:
-                    cls.entities[cls.next_entity_turn].stun -= 1
-                    if cls.entities[cls.next_entity_turn].is_player:
-                        cls.entities[cls.next_entity_turn].add_animation(DelayAnimation(cls.entities[cls.next_entity_turn], 0.3))
+            turn, order, entity = heapq.heappop(cls._queue)
+            if cls.entities.get(entity) != order:
+                continue  # Removed since this entry was queued
+            if entity.health <= 0:
+                cls.remove_entities(entity)
+                continue
+            if not entity.is_player and entity.stun_release_round is not None:
+                if turn < entity.stun_release_round:
+                    continue  # Superseded by a longer stun, which queued another entry
+                entity.stun_release_round = None
+                entity.stun = 0
+            cls.round = turn
+            cls.actions += 1
+            if entity.stun > 0:
+                if entity.is_player:
+                    # The player sits out stunned turns one at a time so each one is shown
+                    entity.stun -= 1
+                    entity.add_animation(DelayAnimation(entity, 0.3))
+                    heapq.heappush(cls._queue, (turn + 1, order, entity))
                 else:
-                    cls.entities[cls.next_entity_turn].take_turn()
-            if cls.entities[cls.next_entity_turn].combo:
-                cls.entities[cls.next_entity_turn].combo = False
+                    # Stuns, and the stun enemies give themselves to act every period turns, just delay the next turn
+                    entity.stun_release_round = turn + entity.stun
+                    heapq.heappush(cls._queue, (entity.stun_release_round, order, entity))
+                continue
+            entity.take_turn()
+            if entity.taking_turn:
+                GridEntity.turn_holders.add(entity)
+            if entity.combo:
+                entity.combo = False
+                heapq.heappush(cls._queue, (turn, order, entity))
             else:
-                cls.next_entity_turn += 1
-            if cls.next_entity_turn >= len(cls.entities):
-                cls.next_entity_turn = 0
-                for entity in cls.entities[:]:
-                    if entity.health <= 0 and entity.destroyed:
-                        cls.entities.remove(entity)
+                heapq.heappush(cls._queue, (turn + 1, order, entity))
+
+    @classmethod
+    def _turn_held(cls):
+        """
+        Returns whether an entity taking turns is still busy, either choosing its action or playing an animation that
+        keeps the turn. Entities that have finished are forgotten, so this only looks at the few that are busy.
+        """
+        held = False
+        for entity in list(GridEntity.turn_holders):
+            if entity.destroyed or not (entity.taking_turn or entity.keep_turn()):
+                GridEntity.turn_holders.discard(entity)
+            elif entity in cls.entities:
+                held = True
+        return held
+
+    @classmethod
+    def _clear_dead(cls):
+        while cls._dead:
+            entity = cls._dead.pop()
+            if entity.health > 0:
+                continue  # Healed before its death was processed
+            if entity.is_player and entity.game_over:
+                cls.game_over = True
+            entity.destroy()
+            cls.remove_entities(entity)
+
+    @classmethod
+    def on_death(cls, entity):
+        """
+        Call when an entity's health drops to zero, so it is destroyed before the next turn is taken.
+        :param entity: The entity that died
+        """
+        if cls._dead is not None:
+            cls._dead.append(entity)
+
+    @classmethod
+    def apply_stun(cls, entity, stun):
+        """
+        Stuns an entity other than the player, keeping whichever of its current stun and the new one lasts longer.
+        :param entity: The entity
+        :param stun: Number of turns it should skip
+        """
+        if entity.stun_release_round is None:
+            entity.stun = max(entity.stun, stun)  # Delays its next turn when that comes up
+            return
+        remaining = entity.stun_release_round - cls.round
+        if stun > remaining:
+            entity.stun = stun
+            entity.stun_release_round = cls.round + stun
+            if entity in cls.entities:
+                heapq.heappush(cls._queue, (entity.stun_release_round, cls.entities[entity], entity))
 
     @classmethod
     def add_entities(cls, *args):
-        cls.entities += args
+        for entity in args:
+            if entity in cls.entities:
+                continue
+            cls.entities[entity] = cls._next_order
+            # New entities act after everything else this round
+            heapq.heappush(cls._queue, (cls.round, cls._next_order, entity))
+            cls._next_order += 1
 
     @classmethod
     def remove_entities(cls, *args):
         for entity in args:
-            if not entity in cls.entities:
-                continue
-            index = cls.entities.index(entity)
-            if index < cls.next_entity_turn:
-                cls.next_entity_turn -= 1
-            cls.entities.pop(index)
\ No newline at end of file
+            cls.entities.pop(entity, None)
+
+    @classmethod
+    def contains(cls, entity):
+        """
+        Returns whether an entity is taking turns.
+        :param entity: The entity to check for
+        :return: True if it has been added and not removed since
+        """
+        return entity in cls.entities
+
+    @classmethod
+    def distance_field_to(cls, game_map, square):
+        """
+        Returns a distance field toward one square, shared by every enemy hunting whatever stands there. Fields are
+        kept until the walls change, so one is only built when its target has moved.
+        :param game_map: The map the square is on
+        :param square: The (x, y) square to measure distance to
+        :return: A DistanceField
+        """
+        key = (game_map, game_map.density_version(game_map.density_mask((GridEntity.DENSITY_WALL,))))
+        if key != cls._distance_fields_key or len(cls._distance_fields) > cls.DISTANCE_FIELD_CACHE_SIZE:
+            cls._distance_fields = {}
+            cls._distance_fields_key = key
+        field = cls._distance_fields.get(square)
+        if field is None:
+            field = game_map.get_distance_field((square,), limit=cls.DISTANCE_FIELD_LIMIT)
+            cls._distance_fields[square] = field
+        return field
@@ -3,73 +3,102 @@ from lib.GridEntity import GridEntity
 from lib.Sprite import StaticSprite
 from lib.Settings import Settings
 
-import random
+from lib.RandomStreams import RandomStreams
 
 
 class Wall(GridEntity):
     density = GridEntity.DENSITY_WALL
+    tileset_path = "images/tileset_engine.png"
+    _tile_rules = None
+    _tile_table = None
 
     def __init__(self, position=(0, 0)):
         super().__init__(position)
         self.solid = True
+        self.tile_sprite = None  # Shared with every other tile using the same image
+
+    @classmethod
+    def get_tile_rules(cls):
+        """
+        Returns the grid rules for picking a wall sprite from the tileset, built once and shared by every wall.
+        :return: Tuple of (key, sprite, inverse, likelihood) tuples, as used by GridEntity.grid_rules
+        """
+        if Wall._tile_rules is None:
+            tw = Settings.Static.TILE_SIZE  # tile width
+            rules = [
+                (("?.?", ".@S", "?.?"), (tw, 0, tw, tw)),
+                (("?.?", "S@S", "?.?"), (2*tw, 0, tw, tw)),
+                (("?.?", "S@S", ".SS"), (3*tw, 0, tw, tw)),
+                (("?.?", "S@S", "SS."), (4*tw, 0, tw, tw)),
+                (("?.?", "S@.", "?.?"), (5*tw, 0, tw, tw)),
+                (("?.?", ".@.", "?S?"), (0, tw, tw, tw)),
+                (("?.?", ".@S", "?SS"), (tw, tw, tw, tw)),
+                (("?.?", "S@S", "SSS"), (2*tw, tw, tw, tw)),
+                ((".SS", "S@S", "SSS"), (3*tw, tw, tw, tw)),
+                (("SS.", "S@S", "SS."), (4*tw, tw, tw, tw)),
+                (("?.?", "S@S", ".S."), (5*tw, tw, tw, tw)),
+                (("?.?", "S@.", ".S?"), (6*tw, tw, tw, tw)),
+                (("?S?", ".@.", "?S?"), (0, 2*tw, tw, tw)),
+                (("?SS", ".@S", "?SS"), (tw, 2*tw, tw, tw)),
+                (("SSS", "S@S", "SSS"), (2*tw, 2*tw, tw, tw)),
+                (("SSS", "S@S", "SS."), (3*tw, 2*tw, tw, tw)),
+                (("SS.", "S@S", ".SS"), (4*tw, 2*tw, tw, tw)),
+                ((".S.", "S@S", "SSS"), (5*tw, 2*tw, tw, tw)),
+                ((".S?", "S@.", "SS?"), (6*tw, 2*tw, tw, tw)),
+                (("?S.", ".@S", "?SS"), (0, 3*tw, tw, tw)),
+                ((".SS", "S@S", "SS."), (tw, 3*tw, tw, tw)),
+                (("SSS", "S@S", ".S."), (2*tw, 3*tw, tw, tw)),
+                (("SS?", "S@.", "?.?"), (3*tw, 3*tw, tw, tw)),
+                (("?SS", ".@S", "?.?"), (4*tw, 3*tw, tw, tw)),
+                (("SSS", "S@S", ".SS"), (5*tw, 3*tw, tw, tw)),
+                (("SS?", "S@.", "SS?"), (6*tw, 3*tw, tw, tw)),
+                (("?SS", ".@S", "?S."), (0, 4*tw, tw, tw)),
+                (("SS.", "S@S", ".S."), (tw, 4*tw, tw, tw)),
+                ((".S.", "S@S", ".SS"), (2*tw, 4*tw, tw, tw)),
+                (("?.?", "S@.", "SS?"), (3*tw, 4*tw, tw, tw)),
+                (("?.?", ".@S", "?S."), (4*tw, 4*tw, tw, tw)),
+                ((".SS", "S@S", ".S."), (5*tw, 4*tw, tw, tw)),
+                (("SS?", "S@.", ".S?"), (6*tw, 4*tw, tw, tw)),
+                (("?S?", ".@.", "?.?"), (0, 5*tw, tw, tw)),
+                (("?S.", ".@S", "?S."), (tw, 5*tw, tw, tw)),
+                ((".SS", "S@S", ".SS"), (2*tw, 5*tw, tw, tw)),
+                (("SS.", "S@S", "SSS"), (3*tw, 5*tw, tw, tw)),
+                ((".S.", "S@S", "SS."), (4*tw, 5*tw, tw, tw)),
+                ((".S.", "S@S", ".S."), (5*tw, 5*tw, tw, tw)),
+                ((".S?", "S@.", ".S?"), (6*tw, 5*tw, tw, tw)),
+                (("?.?", ".@.", "?.?"), (0, 6*tw, tw, tw)),
+                (("?S.", ".@S", "?.?"), (tw, 6*tw, tw, tw)),
+                ((".SS", "S@S", "?.?"), (2*tw, 6*tw, tw, tw)),
+                (("SSS", "S@S", "?.?"), (3*tw, 6*tw, tw, tw)),
+                (("SS.", "S@S", "?.?"), (4*tw, 6*tw, tw, tw)),
+                ((".S.", "S@S", "?.?"), (5*tw, 6*tw, tw, tw)),
+                ((".S?", "S@.", "?.?"), (6*tw, 6*tw, tw, tw)),
+
+                # Default tile in case we've missed something
+                (("@",), (6*tw, 0, tw, tw)),
+            ]
+            Wall._tile_rules = tuple((key, StaticSprite.shared(cls.tileset_path, rect), False, 1.0)
+                                     for key, rect in rules)
+            Wall._tile_table = cls.build_grid_rule_table(Wall._tile_rules)
+        return Wall._tile_rules
+
+    def load_sprite(self, code=None):
+        """
+        Picks the tileset sprite that fits the surrounding walls.
+        :param code: The tile's neighbourhood code, if already known (see MapLayer.neighbourhood_codes)
+        """
+        self.get_tile_rules()  # Builds the shared tile table the first time
+        if code is None:
+            code = self.neighbourhood_code()
+        sprite = None
+        if self.grid_rules:
+            sprite = self.get_sprite_from_grid_rules(code)  # Rules added to this wall come before the tileset's
+        self.tile_sprite = sprite or Wall._tile_table[code]
 
-    def load_sprite(self):
-        surf = ImageHandler.load("images/tileset_engine.png")
-        tw = Settings.Static.TILE_SIZE  # tile width
-
-        self.add_grid_rule(StaticSprite(surf, rect=(tw, 0, tw, tw)), ("?.?", ".@S", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(2*tw, 0, tw, tw)), ("?.?", "S@S", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(3*tw, 0, tw, tw)), ("?.?", "S@S", ".SS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(4*tw, 0, tw, tw)), ("?.?", "S@S", "SS."))
-        self.add_grid_rule(StaticSprite(surf, rect=(5*tw, 0, tw, tw)), ("?.?", "S@.", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(0, tw, tw, tw)), ("?.?", ".@.", "?S?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(tw, tw, tw, tw)), ("?.?", ".@S", "?SS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(2*tw, tw, tw, tw)), ("?.?", "S@S", "SSS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(3*tw, tw, tw, tw)), (".SS", "S@S", "SSS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(4*tw, tw, tw, tw)), ("SS.", "S@S", "SS."))
-        self.add_grid_rule(StaticSprite(surf, rect=(5*tw, tw, tw, tw)), ("?.?", "S@S", ".S."))
-        self.add_grid_rule(StaticSprite(surf, rect=(6*tw, tw, tw, tw)), ("?.?", "S@.", ".S?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(0, 2*tw, tw, tw)), ("?S?", ".@.", "?S?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(tw, 2*tw, tw, tw)), ("?SS", ".@S", "?SS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(2*tw, 2*tw, tw, tw)), ("SSS", "S@S", "SSS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(3*tw, 2*tw, tw, tw)), ("SSS", "S@S", "SS."))
-        self.add_grid_rule(StaticSprite(surf, rect=(4*tw, 2*tw, tw, tw)), ("SS.", "S@S", ".SS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(5*tw, 2*tw, tw, tw)), (".S.", "S@S", "SSS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(6*tw, 2*tw, tw, tw)), (".S?", "S@.", "SS?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(0, 3*tw, tw, tw)), ("?S.", ".@S", "?SS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(tw, 3*tw, tw, tw)), (".SS", "S@S", "SS."))
-        self.add_grid_rule(StaticSprite(surf, rect=(2*tw, 3*tw, tw, tw)), ("SSS", "S@S", ".S."))
-        self.add_grid_rule(StaticSprite(surf, rect=(3*tw, 3*tw, tw, tw)), ("SS?", "S@.", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(4*tw, 3*tw, tw, tw)), ("?SS", ".@S", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(5*tw, 3*tw, tw, tw)), ("SSS", "S@S", ".SS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(6*tw, 3*tw, tw, tw)), ("SS?", "S@.", "SS?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(0, 4*tw, tw, tw)), ("?SS", ".@S", "?S."))
-        self.add_grid_rule(StaticSprite(surf, rect=(tw, 4*tw, tw, tw)), ("SS.", "S@S", ".S."))
-        self.add_grid_rule(StaticSprite(surf, rect=(2*tw, 4*tw, tw, tw)), (".S.", "S@S", ".SS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(3*tw, 4*tw, tw, tw)), ("?.?", "S@.", "SS?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(4*tw, 4*tw, tw, tw)), ("?.?", ".@S", "?S."))
-        self.add_grid_rule(StaticSprite(surf, rect=(5*tw, 4*tw, tw, tw)), (".SS", "S@S", ".S."))
-        self.add_grid_rule(StaticSprite(surf, rect=(6*tw, 4*tw, tw, tw)), ("SS?", "S@.", ".S?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(0, 5*tw, tw, tw)), ("?S?", ".@.", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(tw, 5*tw, tw, tw)), ("?S.", ".@S", "?S."))
-        self.add_grid_rule(StaticSprite(surf, rect=(2*tw, 5*tw, tw, tw)), (".SS", "S@S", ".SS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(3*tw, 5*tw, tw, tw)), ("SS.", "S@S", "SSS"))
-        self.add_grid_rule(StaticSprite(surf, rect=(4*tw, 5*tw, tw, tw)), (".S.", "S@S", "SS."))
-        self.add_grid_rule(StaticSprite(surf, rect=(5*tw, 5*tw, tw, tw)), (".S.", "S@S", ".S."))
-        self.add_grid_rule(StaticSprite(surf, rect=(6*tw, 5*tw, tw, tw)), (".S?", "S@.", ".S?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(0, 6*tw, tw, tw)), ("?.?", ".@.", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(tw, 6*tw, tw, tw)), ("?S.", ".@S", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(2*tw, 6*tw, tw, tw)), (".SS", "S@S", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(3*tw, 6*tw, tw, tw)), ("SSS", "S@S", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(4*tw, 6*tw, tw, tw)), ("SS.", "S@S", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(5*tw, 6*tw, tw, tw)), (".S.", "S@S", "?.?"))
-        self.add_grid_rule(StaticSprite(surf, rect=(6*tw, 6*tw, tw, tw)), (".S?", "S@.", "?.?"))
-
-        # Default tile in case we've missed something
-        self.add_grid_rule(StaticSprite(surf, rect=(6*tw, 0, tw, tw)), ("@",))
-
-        # Use rules to find the most appropriate sprite
-        self.add_sprite(self.get_sprite_from_grid_rules())
+    def draw(self, surface, offset=(0, 0)):
+        if self.tile_sprite:
+            self.tile_sprite.draw(surface, offset=offset, position=self.position)
+        super().draw(surface, offset)
 
 
 class Floor(Wall):
@@ -80,17 +109,16 @@ class Floor(Wall):
         super().__init__(position)
         self.solid = False
 
-    def load_sprite(self):
-        surf = ImageHandler.load("images/tileset_engine.png")
+    def load_sprite(self, code=None):
         tw = Settings.Static.TILE_SIZE  # tile width
 
-        rect = random.choice(
+        rect = RandomStreams.get(RandomStreams.TILES).choice(
             (
                 (0, 0, tw, tw),
                 (6*tw, 0, tw, tw),
             )
         )
-        self.add_sprite(StaticSprite(surf, rect=rect))
+        self.tile_sprite = StaticSprite.shared(self.tileset_path, rect)
 
     def draw(self, surface, offset=(0, 0)):
         super().draw(surface, offset)
@@ -100,16 +128,16 @@ class Exit(Wall):
 
     def open(self):
         self.solid = False
+        if self.layer:
+            self.layer.refresh_cell(*self.position_on_grid.get_position())
 
-    def load_sprite(self):
-        surf = ImageHandler.load("images/Wall_Exit_Open.png")
-        self.add_sprite(StaticSprite(surf, rect=surf.get_rect()))
+    def load_sprite(self, code=None):
+        self.tile_sprite = StaticSprite.shared("images/Wall_Exit_Open.png")
 
 class Stair(Wall):
 
-    def load_sprite(self):
-        surf = ImageHandler.load("images/Wall_Entrance.png")
-        self.add_sprite(StaticSprite(surf, rect=surf.get_rect()))
+    def load_sprite(self, code=None):
+        self.tile_sprite = StaticSprite.shared("images/Wall_Entrance.png")
 
 
 class Decorator(GridEntity):
@@ -139,7 +167,7 @@ class Decorator(GridEntity):
                 "Wall_Eyes.png",
                 "Wall_Torch.png"
             ]
-        path = random.choice(valid_paths)
+        path = RandomStreams.get(RandomStreams.DECOR).choice(valid_paths)
         if path == "Floor_Torch.png":
             self.solid = True
         path = f"images/decorators/{path}"
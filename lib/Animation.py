@@ -152,7 +152,7 @@ class Fwoosh(Animation):
     def update(self, dt, events):
         super().update(dt, events)
         if self.through() < 0.3:
-            self.since_spawn += dt
+            self.since_spawn += dt * ParticleHandler.spawn_rate(FwooshParticle.kind)
         while self.since_spawn > 0.008:
             self.since_spawn -= 0.008
             if not self.position:
@@ -259,7 +259,7 @@ class Scratch(Animation):
     def update(self, dt, events):
         super().update(dt, events)
         if self.through() < 0.3:
-            self.since_spawn += dt
+            self.since_spawn += dt * ParticleHandler.spawn_rate(SlashParticle.kind)
         while self.since_spawn > 0.003:
             self.since_spawn -= 0.003
             root_position = self.parent.position if not self.position else self.position
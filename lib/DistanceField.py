@@ -0,0 +1,58 @@
+from array import array
+
+# Cardinal neighbours, as (dx, dy)
+_NEIGHBORS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class DistanceField:
+
+    UNREACHED = 0x7FFFFFFF
+
+    def __init__(self, blocking, width, height, sources, limit=None):
+        """
+        Computes the number of cardinal steps from every square to the nearest source with a breadth-first search.
+        :param blocking: Flat per-cell sequence (index y * width + x) that is truthy where a square can't be walked
+        :param width: Width of the grid, in squares
+        :param height: Height of the grid, in squares
+        :param sources: Iterable of (x, y) squares to measure distance to
+        :param limit: If specified, squares further than this many steps are left unreached
+        """
+        self.width = width
+        self.height = height
+        self.distances = array("i", [self.UNREACHED]) * (width * height)
+        distances = self.distances
+
+        frontier = []
+        for x, y in sources:
+            if 0 <= x < width and 0 <= y < height and distances[y * width + x]:
+                distances[y * width + x] = 0
+                frontier.append((x, y))
+
+        # Sources themselves may be blocked (e.g. a creature standing on a door), but nothing else that is gets entered
+        steps = 0
+        while frontier and (limit is None or steps < limit):
+            steps += 1
+            next_frontier = []
+            for x, y in frontier:
+                for dx, dy in _NEIGHBORS:
+                    nx = x + dx
+                    ny = y + dy
+                    if not (0 <= nx < width and 0 <= ny < height):
+                        continue
+                    index = ny * width + nx
+                    if distances[index] != self.UNREACHED or blocking[index]:
+                        continue
+                    distances[index] = steps
+                    next_frontier.append((nx, ny))
+            frontier = next_frontier
+
+    def get(self, x, y):
+        """
+        Returns the distance from a square to the nearest source.
+        :param x: The x coordinate
+        :param y: The y coordinate
+        :return: The number of steps, or DistanceField.UNREACHED if out of range, blocked or beyond the limit
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return self.UNREACHED
+        return self.distances[y * self.width + x]
@@ -0,0 +1,71 @@
+import math
+
+# Transforms from octant-local (column, row) coordinates to map coordinates, one column per octant
+_OCTANTS = (
+    (1, 0, 0, -1, -1, 0, 0, 1),
+    (0, 1, -1, 0, 0, -1, 1, 0),
+    (0, 1, 1, 0, 0, -1, -1, 0),
+    (1, 0, 0, 1, -1, 0, 0, -1),
+)
+
+
+def compute_visible(blocking, width, height, origin_x, origin_y, radius):
+    """
+    Computes every square visible from an origin with recursive shadowcasting.
+    :param blocking: Flat per-cell sequence (index y * width + x) that is truthy where a square blocks sight
+    :param width: Width of the grid, in squares
+    :param height: Height of the grid, in squares
+    :param origin_x: X coordinate of the viewer
+    :param origin_y: Y coordinate of the viewer
+    :param radius: Maximum distance that can be seen. Squares count as in range if their distance is <= radius.
+        The comparison is made on integer squared distances, so a radius like math.sqrt(13) includes offset (3, 2).
+    :return: Set of flat indices (y * width + x) of visible squares. Blocking squares that are seen are included.
+    """
+    visible = set()
+    if not (0 <= origin_x < width and 0 <= origin_y < height):
+        return visible
+    visible.add(origin_y * width + origin_x)
+    rows = int(math.ceil(radius))
+    radius_squared = int(radius * radius + 1e-9)  # Undo rounding in radii from sqrt, which can land just short
+    for octant in range(8):
+        _cast_light(blocking, width, height, visible, origin_x, origin_y, 1, 1.0, 0.0, rows, radius_squared,
+                    _OCTANTS[0][octant], _OCTANTS[1][octant], _OCTANTS[2][octant], _OCTANTS[3][octant])
+    return visible
+
+
+def _cast_light(blocking, width, height, visible, cx, cy, row, start, end, rows, radius_squared, xx, xy, yx, yy):
+    """ Lights one octant between the start and end slopes, recursing past each obstacle """
+    if start < end:
+        return
+    new_start = 0.0
+    for j in range(row, rows + 1):
+        dx = -j - 1
+        dy = -j
+        blocked = False
+        while dx <= 0:
+            dx += 1
+            x = cx + dx * xx + dy * xy
+            y = cy + dx * yx + dy * yy
+            left_slope = (dx - 0.5) / (dy + 0.5)
+            right_slope = (dx + 0.5) / (dy - 0.5)
+            if start < right_slope:
+                continue
+            elif end > left_slope:
+                break
+            in_bounds = 0 <= x < width and 0 <= y < height
+            if in_bounds and dx * dx + dy * dy <= radius_squared:
+                visible.add(y * width + x)
+            opaque = not in_bounds or blocking[y * width + x]
+            if blocked:
+                if opaque:
+                    new_start = right_slope
+                    continue
+                blocked = False
+                start = new_start
+            elif opaque and j < rows:
+                blocked = True
+                _cast_light(blocking, width, height, visible, cx, cy, j + 1, start, left_slope, rows, radius_squared,
+                            xx, xy, yx, yy)
+                new_start = right_slope
+        if blocked:
+            break
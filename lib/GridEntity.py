@@ -1,4 +1,4 @@
-import random
+from lib.RandomStreams import RandomStreams
 
 from lib.Primitives import GameObject, Pose
 from lib.Animation import MoveAnimation, InstantMoveAnimation
@@ -6,6 +6,7 @@ from lib.Settings import Settings
 import pygame
 from lib.ImageHandler import ImageHandler
 from lib.Sprite import StaticSprite
+from lib.RenderQueue import RenderQueue
 
 
 class GridEntity(GameObject):
@@ -15,6 +16,7 @@ class GridEntity(GameObject):
     FACTION_ALLY = 2
     faction = FACTION_NEUTRAL
     allies = []
+    turn_holders = set()  # Entities that may be keeping the turn, so the turn system only checks these
 
     DENSITY_EMPTY = 0
     DENSITY_CREATURE = 1
@@ -36,6 +38,10 @@ class GridEntity(GameObject):
     EMPTY_KEY = "."
     CURRENT_KEY = "@"
 
+    # Squares around an entity, in the bit order used by neighbourhood codes
+    NEIGHBOUR_OFFSETS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+    _compiled_grid_rules = {}
+
     is_pickup = False  # Most things aren't pickups
     is_player = False
 
@@ -89,15 +95,17 @@ class GridEntity(GameObject):
         """
         self.grid_rules.append((key, sprite, inverse, likelihood))
 
-    def check_grid_rule(self, key, inverse=False, likelihood=1.0):
+    @staticmethod
+    def compile_grid_rule(key):
         """
-        Checks whether a grid rule should pass or fail
-        :param key: The grid rule as a list of strings
-        :param inverse: If true, inverts the result before returning.
-        :param likelihood: If specified, the rule will only be applied if a random value between 0 and 1 is less than
-            the specified likelihood.
-        :return: True if the rule passes, false otherwise.
+        Parses a grid rule key into bit patterns over the squares around the current one. Keys are only parsed once.
+        :param key: The grid rule as a tuple of strings, as described in add_grid_rule
+        :return: (mask, value, checks). A neighbourhood code matches if code & mask == value. checks is a tuple of
+            (dx, dy, solid) for any squares in the key further than one square away, which must be tested separately.
         """
+        compiled = GridEntity._compiled_grid_rules.get(key)
+        if compiled is not None:
+            return compiled
 
         width = len(key[0])
         origin = None
@@ -106,51 +114,111 @@ class GridEntity(GameObject):
         for y, row in enumerate(key):
             if len(row) != width:
                 raise ValueError("Key must have consistent lengths for all strings.")
-            if self.CURRENT_KEY in row:
-                if origin or row.count(self.CURRENT_KEY) > 1:
-                    raise ValueError(f"Key must contain only one '{self.CURRENT_KEY}' symbol.")
-                origin = row.index(self.CURRENT_KEY), y
+            if GridEntity.CURRENT_KEY in row:
+                if origin or row.count(GridEntity.CURRENT_KEY) > 1:
+                    raise ValueError(f"Key must contain only one '{GridEntity.CURRENT_KEY}' symbol.")
+                origin = row.index(GridEntity.CURRENT_KEY), y
         if not origin:
-            raise ValueError(f"Key must contain only one '{self.CURRENT_KEY}' symbol.")
+            raise ValueError(f"Key must contain only one '{GridEntity.CURRENT_KEY}' symbol.")
 
-        # Now check whether we match the rule
-        match = True
+        mask = 0
+        value = 0
+        checks = []
         for y, row in enumerate(key):
-            if not match:
-                break
             for x, item in enumerate(row):
-                if not match:
-                    break
-                if item == self.CURRENT_KEY or item == self.ANY_KEY:
+                if item == GridEntity.CURRENT_KEY or item == GridEntity.ANY_KEY:
                     continue
-                grid_x = self.position_on_grid.x + (x - origin[0])
-                grid_y = self.position_on_grid.y + (y - origin[1])
-                found_solid = False
-                if not self.layer.cell_in_range(grid_x, grid_y):
-                    found_solid = True  # Count out of range cells as solid
+                offset = (x - origin[0], y - origin[1])
+                solid = item == GridEntity.SOLID_KEY
+                if offset in GridEntity.NEIGHBOUR_OFFSETS:
+                    bit = 1 << GridEntity.NEIGHBOUR_OFFSETS.index(offset)
+                    mask |= bit
+                    if solid:
+                        value |= bit
                 else:
-                    for grid_item in self.layer.peek_at_cell(grid_x, grid_y):
-                        if grid_item.solid:
-                            found_solid = True
-                if found_solid:
-                    if item == self.EMPTY_KEY:
-                        match = False
-                        continue
-                else:
-                    if item == self.SOLID_KEY:
-                        match = False
-                        continue
+                    checks.append((*offset, solid))
+
+        compiled = mask, value, tuple(checks)
+        GridEntity._compiled_grid_rules[key] = compiled
+        return compiled
 
-        match *= (random.random() <= likelihood)
+    @staticmethod
+    def build_grid_rule_table(rules):
+        """
+        Resolves a list of grid rules for every possible neighbourhood at once, so a tile's sprite is a single lookup.
+        Only works for rules that always apply when they match and only look at adjacent squares.
+        :param rules: List of (key, sprite, inverse, likelihood) tuples, as in GridEntity.grid_rules
+        :return: A list of 256 sprites (or None), indexed by neighbourhood code
+        """
+        compiled = []
+        for key, sprite, inverse, likelihood in rules:
+            mask, value, checks = GridEntity.compile_grid_rule(key)
+            if checks or likelihood < 1:
+                raise ValueError("Only rules on adjacent squares that always apply can be put in a table.")
+            compiled.append((mask, value, inverse, sprite))
+        table = []
+        for code in range(256):
+            for mask, value, inverse, sprite in compiled:
+                if ((code & mask) == value) ^ inverse:
+                    table.append(sprite)
+                    break
+            else:
+                table.append(None)
+        return table
+
+    def grid_solid(self, x, y):
+        """
+        Returns whether a square in this entity's layer holds anything solid, counting out of range squares as solid.
+        """
+        if not self.layer.cell_in_range(x, y):
+            return True
+        return self.layer.solid[self.layer.cell_index(x, y)] != 0
+
+    def neighbourhood_code(self):
+        """
+        Returns which of the eight squares around this entity are solid, as a bitmask in NEIGHBOUR_OFFSETS order.
+        """
+        x, y = self.position_on_grid.x, self.position_on_grid.y
+        code = 0
+        for bit, (dx, dy) in enumerate(self.NEIGHBOUR_OFFSETS):
+            if self.grid_solid(x + dx, y + dy):
+                code |= 1 << bit
+        return code
+
+    def check_grid_rule(self, key, inverse=False, likelihood=1.0, code=None):
+        """
+        Checks whether a grid rule should pass or fail
+        :param key: The grid rule as a list of strings
+        :param inverse: If true, inverts the result before returning.
+        :param likelihood: If specified, the rule will only be applied if a random value between 0 and 1 is less than
+            the specified likelihood.
+        :param code: This entity's neighbourhood code, if already known
+        :return: True if the rule passes, false otherwise.
+        """
+        mask, value, checks = self.compile_grid_rule(tuple(key))
+        if code is None:
+            code = self.neighbourhood_code()
+        match = (code & mask) == value
+        if match:
+            x, y = self.position_on_grid.x, self.position_on_grid.y
+            for dx, dy, solid in checks:
+                if self.grid_solid(x + dx, y + dy) != solid:
+                    match = False
+                    break
+        if likelihood < 1:
+            match = match and RandomStreams.get(RandomStreams.TILES).random() <= likelihood
         return match ^ inverse  # ^ is XOR
 
-    def get_sprite_from_grid_rules(self):
+    def get_sprite_from_grid_rules(self, code=None):
         """
         Determines which sprite should be applied by evaluating the grid rules, then returns it.
+        :param code: This entity's neighbourhood code, if already known
         :return: The sprite, or None if no rules applied.
         """
+        if code is None:
+            code = self.neighbourhood_code()
         for key, sprite, inverse, likelihood in self.grid_rules:
-            if self.check_grid_rule(key, inverse, likelihood):
+            if self.check_grid_rule(key, inverse, likelihood, code):
                 return sprite
         return None
 
@@ -208,14 +276,16 @@ class GridEntity(GameObject):
         :param keep_turn: Finish animating move before allowing other entities to take turns
         """
         animation = InstantMoveAnimation if keep_turn else MoveAnimation
-        self.animations.append(animation(self,
-                                         self.position.copy(),
-                                         self.layer.grid_to_world_pixel(*self.position_on_grid.get_position()),
-                                         squish_factor=0.9))
+        self.add_animation(animation(self,
+                                     self.position.copy(),
+                                     self.layer.grid_to_world_pixel(*self.position_on_grid.get_position()),
+                                     squish_factor=0.9))
         self.check_for_pickups()
 
     def add_animation(self, animation):
         self.animations.append(animation)
+        if animation.keep_turn:
+            GridEntity.turn_holders.add(self)
 
     def can_move_to_grid_position(self, x, y):
         """
@@ -229,11 +299,7 @@ class GridEntity(GameObject):
         self.require_grid()
         if not self.layer or not self.layer.cell_in_range(x, y):
             return False
-        others = self.layer.map.get_all_at_position(x, y)
-        for other in others:
-            if other.solid:
-                return False
-        return True
+        return not self.layer.map.cell_solid(x, y)
 
     def move_to_grid_position(self, x, y, keep_turn=False):
         """
@@ -310,9 +376,9 @@ class GridEntity(GameObject):
             image = ImageHandler.load("images/enemy_damage_indicator.png")
         else:
             image = ImageHandler.load("images/enemy_damage_indicator.png")
-        image.set_alpha(150)
-        image.set_colorkey((255, 0, 255))
-        surface.blit(image, rect)
+        RenderQueue.set_alpha(image, 150)
+        RenderQueue.set_colorkey(image, (255, 0, 255))
+        RenderQueue.blit(surface, image, rect)
 
     def destroy(self):
         if self.destroyed:
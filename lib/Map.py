@@ -5,13 +5,23 @@ from lib.GridEntity import GridEntity
 from lib.Settings import Settings
 from lib.Primitives import Pose
 from lib.Camera import Camera
+from lib.Math import iter_line
+from lib.FieldOfView import compute_visible
+from lib.DistanceField import DistanceField
+from lib import Pathfinding
+from lib.RenderQueue import RenderQueue
+import math
 import pygame
+from collections import OrderedDict
 
 
 class Map:
     TILE_WIDTH = Settings.Static.TILE_SIZE
     TILE_HEIGHT = Settings.Static.TILE_SIZE
     OUT_OF_FRAME_DISTANCE = TILE_WIDTH*2  # The distance outside the window frame we stop drawing objects
+    FOV_CACHE_SIZE = 256  # Number of visibility sets kept per blocking mask before they are cleared
+    CHUNK_SIZE = 8  # Width and height, in tiles, of the surfaces baked layers are drawn from
+    CHUNK_CACHE_SIZE = 64  # Number of baked chunk surfaces each layer keeps before dropping the least recently drawn
 
     def __init__(self, width, height):
         """
@@ -24,6 +34,16 @@ class Map:
 
         self.layers = []
 
+        # Per-cell summaries of every layer combined, kept up to date as objects are added, moved and removed
+        self.solid = bytearray(width * height)  # Bitmask of (1 << density) for each solid object in the cell
+        self.densities = bytearray(width * height)  # Bitmask of (1 << density) for each object in the cell
+
+        # Incremented whenever a cell's solidity or densities change, so derived data can tell it is stale
+        self.version = 0
+        self._density_versions = [0] * 8  # Same, but counted separately for each density bit
+
+        self._fov_cache = {}  # (version, blocking grid, {(x, y, radius): visible set}) by blocking density mask
+
     def get_hovered_tile(self):
         mpos = Pose(pygame.mouse.get_pos(), 0)
         mpos -= Pose((Settings.Static.WINDOW_WIDTH//2, Settings.Static.WINDOW_HEIGHT//2), 0)
@@ -83,6 +103,184 @@ class Map:
             objects += layer.peek_at_cell(x, y)
         return objects
 
+    def iter_all_at_position(self, x, y):
+        """
+        Iterates over all game objects at that point, regardless of layer, without copying any cells.
+
+        The map must not be modified while iterating; use get_all_at_position if the loop moves or removes objects.
+        :param x: X coordinate
+        :param y: Y coordinate
+        :return: A generator of game objects
+        """
+        if not self.cell_in_range(x, y):
+            return
+        index = y * self.width + x
+        for layer in self.layers:
+            cell = layer._cells.get(index)
+            if cell:
+                yield from cell
+
+    def cell_populated(self, x, y):
+        """
+        Returns whether there is any game object at that point, regardless of layer
+        :param x: X coordinate
+        :param y: Y coordinate
+        :return: True if the cell contains anything
+        """
+        if not self.cell_in_range(x, y):
+            return False
+        index = y * self.width + x
+        for layer in self.layers:
+            if index in layer._cells:
+                return True
+        return False
+
+    def first_at_position(self, x, y, factions=None, densities=None):
+        """
+        Returns the first game object at that point matching the given factions and densities, regardless of layer
+        :param x: X coordinate
+        :param y: Y coordinate
+        :param factions: If specified, only objects of these factions match
+        :param densities: If specified, only objects of these densities match
+        :return: The game object, or None if nothing matches
+        """
+        for item in self.iter_all_at_position(x, y):
+            if factions and item.faction not in factions:
+                continue
+            if densities and item.density not in densities:
+                continue
+            return item
+        return None
+
+    @staticmethod
+    def density_mask(densities):
+        """
+        Converts an iterable of densities to the bitmask format used by the layers' density arrays.
+        :param densities: Iterable of GridEntity.DENSITY_* values
+        :return: The bitmask
+        """
+        mask = 0
+        for density in densities:
+            mask |= 1 << density
+        return mask
+
+    def cell_solid(self, x, y):
+        """
+        Returns whether any object at that point is solid, regardless of layer
+        :param x: X coordinate
+        :param y: Y coordinate
+        :return: True if something solid is there
+        """
+        return self.solid[y * self.width + x] != 0
+
+    def cell_has_density(self, x, y, mask):
+        """
+        Returns whether any object at that point has one of the densities in the mask, regardless of layer
+        :param x: X coordinate
+        :param y: Y coordinate
+        :param mask: Bitmask of densities, as returned by Map.density_mask
+        :return: True if a matching object is there
+        """
+        return self.densities[y * self.width + x] & mask != 0
+
+    def _refresh_cell(self, index):
+        """
+        Recombines the layer summaries for one cell. Called by the layers whenever one of their cells changes.
+        :param index: The flat index of the cell
+        """
+        solid = 0
+        densities = 0
+        for layer in self.layers:
+            solid |= layer.solid[index]
+            densities |= layer.densities[index]
+        if solid != self.solid[index] or densities != self.densities[index]:
+            changed = (densities ^ self.densities[index]) | (solid ^ self.solid[index])
+            self.solid[index] = solid
+            self.densities[index] = densities
+            self.version += 1
+            bit = 0
+            while changed:
+                if changed & 1:
+                    self._density_versions[bit] += 1
+                changed >>= 1
+                bit += 1
+
+    def density_version(self, mask):
+        """
+        Returns a number that changes whenever any cell gains or loses an object with one of the masked densities, or
+        one of those objects changes solidity.
+        :param mask: Bitmask of densities, as returned by Map.density_mask
+        :return: The version number
+        """
+        version = 0
+        for bit, count in enumerate(self._density_versions):
+            if mask & (1 << bit):
+                version += count
+        return version
+
+    def blocking_grid(self, mask, solid_only=False):
+        """
+        Returns a flat grid (index y * width + x) that is 1 wherever an object with one of the masked densities is.
+        :param mask: Bitmask of densities, as returned by Map.density_mask
+        :param solid_only: If true, only count objects that are also solid
+        :return: A bytes object the size of the map
+        """
+        table = bytes(1 if value & mask else 0 for value in range(256))
+        return (self.solid if solid_only else self.densities).translate(table)
+
+    def get_visible_cells(self, origin, radius, blocking_types=(GridEntity.DENSITY_WALL,)):
+        """
+        Returns the squares visible from a point, computed once with shadowcasting and cached until an object with
+        one of the blocking densities is added, moved or removed.
+        :param origin: The viewer's grid position
+        :param radius: Maximum distance that can be seen
+        :param blocking_types: Densities of obstacles that block sight
+        :return: Set of flat indices (y * width + x) of visible squares. Do not modify it.
+        """
+        mask = self.density_mask(blocking_types)
+        version = self.density_version(mask)
+        entry = self._fov_cache.get(mask)
+        if entry is None or entry[0] != version or len(entry[2]) > self.FOV_CACHE_SIZE:
+            entry = self._fov_cache[mask] = (version, self.blocking_grid(mask), {})
+        _version, blocking, visible_sets = entry
+        key = (origin.x, origin.y, radius)
+        visible = visible_sets.get(key)
+        if visible is None:
+            visible = visible_sets[key] = compute_visible(blocking, self.width, self.height, origin.x, origin.y, radius)
+        return visible
+
+    def get_distance_field(self, sources, limit=None, blocking_types=(GridEntity.DENSITY_WALL,)):
+        """
+        Builds a map of walking distances toward a set of squares, routing around solid obstacles.
+        :param sources: Iterable of (x, y) squares to measure distance to
+        :param limit: If specified, squares further than this many steps are left unreached
+        :param blocking_types: Densities of solid obstacles that can't be walked through
+        :return: A DistanceField
+        """
+        blocking = self.blocking_grid(self.density_mask(blocking_types), solid_only=True)
+        return DistanceField(blocking, self.width, self.height, sources, limit)
+
+    def find_path(self, start, goal, move_squares, blocking_types=None, budget=None):
+        """
+        Plans the fewest-moves path between two squares using the given movement pattern.
+        :param start: Starting grid position
+        :param goal: Goal grid position. It may be occupied (e.g. by the entity being chased).
+        :param move_squares: Squares relative to the mover that it can move to in one turn, like Enemy.move_squares
+        :param blocking_types: Densities of solid objects that can't be moved through. By default, anything solid.
+        :param budget: If specified, give up after searching this many squares
+        :return: List of grid positions from after the start up to and including the goal, or None if there is no path
+        """
+        moves = tuple((square.x, square.y) for square in move_squares)
+        if blocking_types is None:
+            blocking = self.solid
+        else:
+            blocking = self.blocking_grid(self.density_mask(blocking_types), solid_only=True)
+        path = Pathfinding.find_path(blocking, self.width, self.height, (start.x, start.y), (goal.x, goal.y), moves,
+                                     budget)
+        if path is None:
+            return None
+        return [Pose(square) for square in path]
+
     def add_to_cell(self, game_object, x, y, layer_key):
         for layer in self.layers:
             if layer.key == layer_key:
@@ -102,6 +300,7 @@ class Map:
                 layer.draw(surface, offset=offset, density=(GridEntity.DENSITY_CREATURE, GridEntity.DENSITY_PICKUP))
             else:
                 layer.draw(surface, offset=offset)
+            RenderQueue.flush()
 
     def get_layer(self, key):
         for layer in self.layers:
@@ -121,63 +320,74 @@ class Map:
         :param offset: if true, start on second square
         :return: last open square and the entity that was hit
         """
-        diff = end - start
-        if not diff.magnitude():
+        mask = self.density_mask(blocking_types)
+        if start.x == end.x and start.y == end.y:
             if offset:
                 return None, None
             else:
                 if not self.cell_in_range(start.x, start.y):
                     return None, None
-                for item in self.get_all_at_position(start.x, start.y):
-                    if item.density in blocking_types:
-                        return None, item
+                if self.cell_has_density(start.x, start.y, mask):
+                    return None, self.first_at_position(start.x, start.y, densities=blocking_types)
                 return start, None
         prev = None
-        if abs(diff.y) > abs(diff.x):
-            for dy in range(1 if offset else 0, abs(diff.y)+1):
-                scale = abs(dy / diff.y)
-                p = start + diff*scale
-                p.x = round(p.x)
-                p.y = round(p.y)
-                if not self.cell_in_range(p.x, p.y):
-                    return prev, None
-                for item in self.get_all_at_position(p.x, p.y):
-                    if item.density in blocking_types:
-                        return prev, item
-                prev = p
-        else:
-            for dx in range(1 if offset else 0, abs(diff.x)+1):
-                scale = abs(dx / diff.x)
-                p = start + diff*scale
-                p.x = round(p.x)
-                p.y = round(p.y)
-                if not self.cell_in_range(p.x, p.y):
-                    return prev, None
-                for item in self.get_all_at_position(p.x, p.y):
-                    if item.density in blocking_types:
-                        return prev, item
-                prev = p
+        width = self.width
+        height = self.height
+        densities = self.densities
+        for x, y in iter_line(start.x, start.y, end.x, end.y, offset=offset):
+            if not (0 <= x < width and 0 <= y < height):
+                return (Pose(prev) if prev else None), None
+            if densities[y * width + x] & mask:
+                return (Pose(prev) if prev else None), self.first_at_position(x, y, densities=blocking_types)
+            prev = x, y
         return end, None
 
     def get_entity(self, squares, origin=Pose((0, 0)), factions=None):
         for square in squares:
             p = square + origin
-            for item in self.get_all_at_position(p.x, p.y):
-                if not factions or item.faction in factions:
-                    return square, item
+            item = self.first_at_position(p.x, p.y, factions=factions)
+            if item:
+                return square, item
         return None, None
 
     def filter_line_of_sight(self, squares, origin, blocking_types=(GridEntity.DENSITY_WALL,)):
-        new_squares = []
-        for square in squares:
-            sq, item = self.raycast(origin, origin + square, blocking_types, offset=True)
-            if sq and (square + origin - sq).magnitude() == 0:
-                new_squares.append(square)
-        return new_squares
+        """
+        Keeps only the squares that can be seen from the origin.
+        :param squares: Squares relative to the origin
+        :param origin: The viewer's grid position
+        :param blocking_types: Densities of obstacles that block sight. Squares containing one are never returned.
+        :return: List of the visible squares
+        """
+        if not squares:
+            return []
+        radius = math.sqrt(max(square.x * square.x + square.y * square.y for square in squares))
+        visible = self.get_visible_cells(origin, radius, blocking_types)
+        return [square for square in squares if self._square_in_sight(square, origin, visible, blocking_types)]
 
-    def check_line_of_sight(self, square, origin, blocking_types=(GridEntity.DENSITY_WALL,)):
-        end, item = self.raycast(origin, origin + square, blocking_types, offset=True)
-        return end and (square + origin - end).magnitude() == 0
+    def check_line_of_sight(self, square, origin, blocking_types=(GridEntity.DENSITY_WALL,), radius=None):
+        """
+        Returns whether a square can be seen from the origin.
+        :param square: Square relative to the origin
+        :param origin: The viewer's grid position
+        :param blocking_types: Densities of obstacles that block sight
+        :param radius: If specified, the sight radius to compute visibility with, so the result can be shared by
+            several checks from the same origin. Must be at least the distance to the square.
+        :return: True if the square is visible
+        """
+        if radius is None:
+            radius = math.sqrt(square.x * square.x + square.y * square.y)
+        visible = self.get_visible_cells(origin, radius, blocking_types)
+        return self._square_in_sight(square, origin, visible, blocking_types)
+
+    def _square_in_sight(self, square, origin, visible, blocking_types):
+        if not square.x and not square.y:
+            return False  # A viewer's own square doesn't count, as with an offset raycast
+        x = origin.x + square.x
+        y = origin.y + square.y
+        if not self.cell_in_range(x, y):
+            return False
+        index = y * self.width + x
+        return index in visible and not self.densities[index] & self.density_mask(blocking_types)
 
     class MapCell(list):
         # Making this its own class in case we wanted to add anything fancy to it later for pathfinding, etc.
@@ -186,10 +396,17 @@ class Map:
     class MapLayer:
         def __init__(self, parent_map, key=None):
             self.map = parent_map
-            self.cells = [[Map.MapCell() for _ in range(parent_map.width)] for _ in range(parent_map.height)]
-            self._populated_cells = set()
             self.key = key
 
+            # Sparse entity table, keyed by flat cell index (y * width + x). Only populated cells have an entry.
+            self._cells = {}
+
+            # Flat per-cell summaries of the entity table, so cells can be tested without touching Python lists
+            size = parent_map.width * parent_map.height
+            self.solid = bytearray(size)  # Bitmask of (1 << density) for each solid entity in the cell
+            self.densities = bytearray(size)  # Bitmask of (1 << density) for each entity in the cell
+            self.factions = bytearray(size)  # Bitmask of (1 << faction) for each entity in the cell
+
             # Parallax multipliers; lower numbers mean the layer moves slower with a given offset
             self.x_parallax = 1
             self.y_parallax = 1
@@ -199,6 +416,10 @@ class Map:
             self._updates_enabled = True
             self._draws_enabled = True
 
+            # Baked chunk surfaces, keyed by (chunk x, chunk y), in least to most recently drawn order
+            self._baking_enabled = False
+            self._chunks = OrderedDict()
+
         def enable_updates(self, enable=True):
             if enable:
                 self._updates_enabled = True
@@ -211,60 +432,161 @@ class Map:
             else:
                 self._draws_enabled = False
 
+        def enable_baking(self, enable=True):
+            """
+            Draws the layer from cached surfaces, each holding a square chunk of tiles, instead of drawing every
+            object each frame. Only use for layers whose objects don't move or animate; a chunk is redrawn only when
+            an object is added to or removed from it, or when one of its cells is refreshed or invalidated.
+            :param enable: Whether to bake the layer
+            """
+            self._baking_enabled = enable
+            self._chunks.clear()
+
+        def invalidate_cell(self, x, y):
+            """
+            Call this after changing how an object in a baked layer looks, so its chunk gets redrawn.
+            :param x: The x coordinate
+            :param y: The y coordinate
+            """
+            self._chunks.pop((x // Map.CHUNK_SIZE, y // Map.CHUNK_SIZE), None)
+
+        def cell_index(self, x, y):
+            return y * self.map.width + x
+
+        def neighbourhood_codes(self):
+            """
+            Computes GridEntity.neighbourhood_code for every cell in the layer at once.
+            :return: A bytes object indexed by flat cell index (y * width + x)
+            """
+            width = self.map.width
+            height = self.map.height
+
+            # Solidity as 0 or 1 per cell, with a solid border so out of range squares count as solid
+            solid = self.solid.translate(bytes([0] + [1] * 255))
+            padded_width = width + 2
+            padded = bytearray(b"\x01" * (padded_width * (height + 2)))
+            for y in range(height):
+                start = (y + 1) * padded_width + 1
+                padded[start:start + width] = solid[y * width:(y + 1) * width]
+
+            # Each byte holds at most one bit per neighbour, so the grids can be combined as big integers
+            codes = 0
+            for bit, (dx, dy) in enumerate(GridEntity.NEIGHBOUR_OFFSETS):
+                starts = ((y + 1 + dy) * padded_width + 1 + dx for y in range(height))
+                shifted = b"".join(padded[start:start + width] for start in starts)
+                codes |= int.from_bytes(shifted, "big") << bit
+            return codes.to_bytes(width * height, "big")
+
+        def _refresh_cell(self, index):
+            """
+            Recomputes the flat summaries for one cell from its entities.
+            :param index: The flat index of the cell
+            """
+            if self._chunks:
+                width = self.map.width
+                self.invalidate_cell(index % width, index // width)
+            cell = self._cells.get(index)
+            if not cell:
+                self._cells.pop(index, None)
+                self.solid[index] = 0
+                self.densities[index] = 0
+                self.factions[index] = 0
+                self.map._refresh_cell(index)
+                return
+            solid = 0
+            densities = 0
+            factions = 0
+            for game_object in cell:
+                if game_object.solid:
+                    solid |= 1 << game_object.density
+                densities |= 1 << game_object.density
+                factions |= 1 << game_object.faction
+            self.solid[index] = solid
+            self.densities[index] = densities
+            self.factions[index] = factions
+            self.map._refresh_cell(index)
+
+        def refresh_cell(self, x, y):
+            """
+            Call this after changing the solidity of an object that is already in the layer, so the cell
+            summaries stay accurate.
+            :param x: The x coordinate
+            :param y: The y coordinate
+            """
+            self._refresh_cell(self.cell_index(x, y))
+
         def add_to_cell(self, game_object, x, y):
-            self.cells[y][x].append(game_object)
+            index = self.cell_index(x, y)
+            cell = self._cells.get(index)
+            if cell is None:
+                cell = Map.MapCell()
+                self._cells[index] = cell
+            cell.append(game_object)
 
-            coordinates = (x, y)
             game_object.add_to_layer(self, x, y)
-            if coordinates not in self._populated_cells:
-                self._populated_cells.add(coordinates)
+            self._refresh_cell(index)
 
         def pop_from_cell(self, x, y):
-            if not self.cells[y][x]:
+            index = self.cell_index(x, y)
+            cell = self._cells.get(index)
+            if not cell:
                 return None
-            result = self.cells[y][x].pop()
-            if not self.cells[y][x] and (x, y) in self._populated_cells:
-                self._populated_cells.remove((x, y))
+            result = cell.pop()
+            self._refresh_cell(index)
             return result
 
         def peek_at_cell(self, x, y):
             if not self.cell_in_range(x, y):
                 return []
-            return self.cells[y][x].copy()
+            cell = self._cells.get(self.cell_index(x, y))
+            return cell.copy() if cell else []
+
+        def view_cell(self, x, y):
+            """
+            Returns the objects in a cell without copying them. The result must be treated as read-only, and must not
+            be iterated while objects are being added to or removed from the cell; use peek_at_cell for that.
+            :param x: The x coordinate
+            :param y: The y coordinate
+            :return: The cell's objects, or an empty tuple if the cell is empty or out of range
+            """
+            if not self.cell_in_range(x, y):
+                return ()
+            return self._cells.get(self.cell_index(x, y), ())
 
         def cell_occupied(self, x, y):
-            return len(self.peek_at_cell(x, y)) > 0
+            return self.cell_in_range(x, y) and self.cell_index(x, y) in self._cells
 
         def map_cell_occupied(self, x, y):
-            return len(self.map.get_all_at_position(x, y)) > 0
+            return self.map.cell_populated(x, y)
 
         def cell_in_range(self, x, y):
             return 0 <= x <= self.map.width - 1 and 0 <= y <= self.map.height - 1
 
         def pop_all_from_cell(self, x, y):
             result = self.peek_at_cell(x, y)
-            self.cells[y][x] = []
-            if (x, y) in self._populated_cells:
-                self._populated_cells.remove((x, y))
+            index = self.cell_index(x, y)
+            self._cells.pop(index, None)
+            self._refresh_cell(index)
             return result
 
         def remove_from_cell(self, x, y, item):
-            self.cells[y][x].remove(item)
-            if not self.cells[y][x] and (x, y) in self._populated_cells:
-                self._populated_cells.remove((x, y))
+            index = self.cell_index(x, y)
+            self._cells[index].remove(item)
+            self._refresh_cell(index)
 
         def populated_cells(self):
-            for x, y in self._populated_cells.copy():
-                yield self.cells[y][x]
+            for cell in list(self._cells.values()):
+                yield cell
 
         def cell_coordinates(self):
-            for y, row in enumerate(self.cells):
-                for x, cell in enumerate(row):
+            for y in range(self.map.height):
+                for x in range(self.map.width):
                     yield x, y
 
         def populated_cells_and_coordinates(self):
-            for x, y in self._populated_cells:
-                yield self.cells[y][x], x, y
+            width = self.map.width
+            for index, cell in self._cells.items():
+                yield cell, index % width, index // width
 
         def draw(self, surface, offset=(0, 0), density=None):
             if not self._draws_enabled:
@@ -274,18 +596,64 @@ class Map:
             bottom_right = camera_position + Pose((Settings.Static.GAME_WIDTH//2, Settings.Static.GAME_HEIGHT//2), 0)
             x1, y1 = self.world_pixel_to_grid(*top_left.get_position())
             x2, y2 = self.world_pixel_to_grid(*bottom_right.get_position())
-            for x in range(int(x1 - 2), int(x2+3)):
-                for y in range(int(y1 - 2), int(y2+3)):
-                    if self.map.cell_in_range(x, y):
-                        cell = self.peek_at_cell(x, y)
-                        for game_object in cell:
-                            if not density or game_object.density in density:
-                                game_object.draw(surface, offset=offset)
+            if self._baking_enabled and not density:
+                self.draw_baked(surface, offset, x1, y1, x2, y2)
+                return
+            cells = self._cells
+            width = self.map.width
+            for x in range(max(int(x1 - 2), 0), min(int(x2 + 3), width)):
+                for y in range(max(int(y1 - 2), 0), min(int(y2 + 3), self.map.height)):
+                    cell = cells.get(y * width + x)
+                    if not cell:
+                        continue
+                    for game_object in cell:
+                        if not density or game_object.density in density:
+                            game_object.draw(surface, offset=offset)
+
+        def draw_baked(self, surface, offset, x1, y1, x2, y2):
+            size = Map.CHUNK_SIZE
+            chunks = self._chunks
+            for chunk_x in range(max(int(x1 - 2), 0) // size, (min(int(x2 + 3), self.map.width) - 1) // size + 1):
+                for chunk_y in range(max(int(y1 - 2), 0) // size, (min(int(y2 + 3), self.map.height) - 1) // size + 1):
+                    key = chunk_x, chunk_y
+                    chunk = chunks.get(key)
+                    if chunk is None:
+                        chunk = self.bake_chunk(chunk_x, chunk_y)
+                        chunks[key] = chunk
+                        if len(chunks) > Map.CHUNK_CACHE_SIZE:
+                            chunks.popitem(last=False)
+                    else:
+                        chunks.move_to_end(key)
+                    chunk_surface, left, top = chunk
+                    RenderQueue.blit(surface, chunk_surface, (left + offset[0], top + offset[1]))
+
+        def bake_chunk(self, chunk_x, chunk_y):
+            """
+            Draws one chunk of the layer onto its own surface.
+            :param chunk_x: The chunk's x coordinate, in chunks
+            :param chunk_y: The chunk's y coordinate, in chunks
+            :return: The surface, and the world pixel position of its top left corner
+            """
+            size = Map.CHUNK_SIZE
+            left, top = self.grid_to_world_pixel(chunk_x * size, chunk_y * size)
+            left -= Map.TILE_WIDTH//2
+            top -= Map.TILE_HEIGHT//2
+            chunk_surface = pygame.Surface((size * Map.TILE_WIDTH, size * Map.TILE_HEIGHT), pygame.SRCALPHA)
+            cells = self._cells
+            width = self.map.width
+            for x in range(chunk_x * size, min((chunk_x + 1) * size, width)):
+                for y in range(chunk_y * size, min((chunk_y + 1) * size, self.map.height)):
+                    cell = cells.get(y * width + x)
+                    if not cell:
+                        continue
+                    for game_object in cell:
+                        game_object.draw(chunk_surface, offset=(-left, -top))
+            RenderQueue.flush()
+            return chunk_surface, left, top
 
         def draw_overlays(self, surface, offset=(0, 0)):
-            for cell in self._populated_cells:
-                entities = self.peek_at_cell(*cell)
-                for entity in entities:
+            for cell in self._cells.values():
+                for entity in cell:
                     entity.draw_targets(surface, offset)
 
         def update(self, dt, events):
@@ -297,26 +665,24 @@ class Map:
             bottom_right = camera_position + Pose((Settings.Static.GAME_WIDTH//2, Settings.Static.GAME_HEIGHT//2), 0)
             x1, y1 = self.world_pixel_to_grid(*top_left.get_position())
             x2, y2 = self.world_pixel_to_grid(*bottom_right.get_position())
-            turn_entities = set(TurnManager.entities)
-            for x in range(int(x1 - 5), int(x2+5)):
-                for y in range(int(y1 - 5), int(y2+5)):
-                    if self.map.cell_in_range(x, y):
-                        cell = self.peek_at_cell(x, y)
-                        for game_object in cell:
+            cells = self._cells
+            width = self.map.width
+            for x in range(max(int(x1 - 5), 0), min(int(x2 + 5), width)):
+                for y in range(max(int(y1 - 5), 0), min(int(y2 + 5), self.map.height)):
+                    cell = cells.get(y * width + x)
+                    if not cell:
+                        continue
+                    # Copy non-empty cells, since updating an object can move it out of the cell
+                    for game_object in cell.copy():
                             if game_object in updated_objects:
                                 continue
                             else:
-                                if game_object not in turn_entities:
+                                if not TurnManager.contains(game_object):
                                     if game_object.is_player or isinstance(game_object, Enemy):
                                         TurnManager.add_entities(game_object)
-                                        turn_entities.add(game_object)
                                 updated_objects.add(game_object)
                                 game_object.update(dt, events)
 
-            for game_object in updated_objects:
-                if game_object not in turn_entities:
-                    TurnManager.remove_entities(game_object)
-
 
         def grid_to_world_pixel(self, x, y):
             x = ((x * Map.TILE_WIDTH) + self.x_offset) * self.x_parallax
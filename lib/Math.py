@@ -89,26 +89,65 @@ class PowerCurve(Curve):
             return 1 - (i_factor * ((1 - x)/self._decel_time)**self._power * self._max_speed * self._decel_time)
 
 
+def iter_line(x0, y0, x1, y1, offset=False):
+    """
+    Walks the grid squares on a line with an integer DDA, without allocating a Pose per square. Produces exactly the
+    squares the original float stepping did, including Python's round-half-to-even behavior.
+    :param x0: Starting x coordinate, as an integer
+    :param y0: Starting y coordinate, as an integer
+    :param x1: Ending x coordinate, as an integer
+    :param y1: Ending y coordinate, as an integer
+    :param offset: If true, skip the starting square
+    :return: A generator of (x, y) tuples
+    """
+    dx = x1 - x0
+    dy = y1 - y0
+    y_major = abs(dy) > abs(dx)
+    if y_major:
+        major, major_diff, minor, minor_diff = y0, dy, x0, dx
+    else:
+        major, major_diff, minor, minor_diff = x0, dx, y0, dy
+    length = abs(major_diff)
+    if not length:
+        if not offset:
+            yield x0, y0
+        return
+    step = 1 if major_diff > 0 else -1
+
+    # The minor coordinate is minor + minor_diff * d / length; track it as quotient + remainder / length
+    quotient = minor
+    remainder = 0
+    for d in range(length + 1):
+        if d or not offset:
+            twice = 2 * remainder
+            if twice > length:
+                rounded = quotient + 1
+            elif twice < length:
+                rounded = quotient
+            else:
+                # Exactly halfway; defer to the float arithmetic the original stepping used so ties round the same
+                rounded = round(minor + minor_diff * abs(d / major_diff) * 1)
+            if y_major:
+                yield rounded, major
+            else:
+                yield major, rounded
+        major += step
+        remainder += minor_diff
+        if remainder >= length:
+            remainder -= length
+            quotient += 1
+        elif remainder < 0:
+            remainder += length
+            quotient -= 1
+
+
 def get_line(start, end, offset=False):
     if offset:
         squares = []
     else:
         squares = [start]
-    diff = end - start
-    if abs(diff.y) > abs(diff.x):
-        for dy in range(1, abs(diff.y) + 1):
-            scale = abs(dy / diff.y)
-            p = start + diff * scale
-            p.x = round(p.x)
-            p.y = round(p.y)
-            squares.append(p)
-    else:
-        for dx in range(1, abs(diff.x) + 1):
-            scale = abs(dx / diff.x)
-            p = start + diff * scale
-            p.x = round(p.x)
-            p.y = round(p.y)
-            squares.append(p)
+    for x, y in iter_line(start.x, start.y, end.x, end.y, offset=True):
+        squares.append(Pose((x, y)))
     return squares
 
 
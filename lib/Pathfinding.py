@@ -0,0 +1,70 @@
+import heapq
+
+
+def find_path(blocking, width, height, start, goal, moves, budget=None):
+    """
+    Finds a shortest path with A*, where every move costs one turn.
+    :param blocking: Flat per-cell sequence (index y * width + x) that is truthy where a square can't be entered. The
+        goal may be blocked (e.g. by the creature being chased) and is still reachable.
+    :param width: Width of the grid, in squares
+    :param height: Height of the grid, in squares
+    :param start: Starting square, as (x, y)
+    :param goal: Goal square, as (x, y)
+    :param moves: Iterable of (dx, dy) offsets that can be moved by in one turn
+    :param budget: If specified, give up after expanding this many squares
+    :return: List of (x, y) squares from after the start up to and including the goal, or None if there is no path
+    """
+    moves = tuple(moves)
+    if not moves:
+        return None
+    start_x, start_y = start
+    goal_x, goal_y = goal
+    if not (0 <= goal_x < width and 0 <= goal_y < height):
+        return None
+    if start == goal:
+        return []
+
+    # Admissible heuristic: no single move covers more than reach squares along either axis
+    reach = max(max(abs(dx), abs(dy)) for dx, dy in moves) or 1
+
+    def heuristic(x, y):
+        return -(-max(abs(goal_x - x), abs(goal_y - y)) // reach)
+
+    start_index = start_y * width + start_x
+    goal_index = goal_y * width + goal_x
+    came_from = {start_index: None}
+    cost = {start_index: 0}
+    counter = 0  # Tie-breaker, so the heap never compares beyond what we put in it
+    heap = [(heuristic(start_x, start_y), counter, start_x, start_y)]
+    closed = set()
+    while heap:
+        _, _, x, y = heapq.heappop(heap)
+        index = y * width + x
+        if index in closed:
+            continue  # A stale entry for a square already reached more cheaply
+        if index == goal_index:
+            path = []
+            while index != start_index:
+                path.append((index % width, index // width))
+                index = came_from[index]
+            path.reverse()
+            return path
+        closed.add(index)
+        if budget is not None and len(closed) > budget:
+            return None
+        next_cost = cost[index] + 1
+        for dx, dy in moves:
+            nx = x + dx
+            ny = y + dy
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+            next_index = ny * width + nx
+            if blocking[next_index] and next_index != goal_index:
+                continue
+            if next_index in cost and cost[next_index] <= next_cost:
+                continue
+            cost[next_index] = next_cost
+            came_from[next_index] = index
+            counter += 1
+            heapq.heappush(heap, (next_cost + heuristic(nx, ny), counter, nx, ny))
+    return None
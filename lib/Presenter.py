@@ -0,0 +1,93 @@
+import pygame
+
+from lib.Settings import Settings
+
+
+class Presenter:
+    """
+    Static class that scales the game surface up onto the window and shows it.
+
+    By default the whole frame is scaled straight into the window and flipped. With
+    Settings.Dynamic.DIRTY_RECT_PRESENTATION on, only bands of rows that changed since the last frame are scaled and
+    updated, so menus and frames where nothing moves cost next to nothing.
+    """
+
+    BAND_HEIGHT = 8  # Height, in game pixels, of the row bands compared for changes
+
+    initialized = False
+    screen = None
+    window = None
+    previous = None  # The game surface's pixels as of the last dirty rect presentation
+
+    @classmethod
+    def init(cls, screen, window):
+        """
+        Initializes the presenter.
+        :param screen: The surface the game draws on
+        :param window: The display surface, which should be a whole multiple of the game surface's size
+        """
+        cls.screen = screen
+        cls.window = window
+        cls.previous = None
+        cls.initialized = True
+
+    @classmethod
+    def present(cls):
+        """
+        Shows the game surface's current contents in the window.
+        """
+        if not cls.initialized:
+            raise ValueError("Presenter must be initialized to call this method.")
+        if not Settings.Dynamic.DIRTY_RECT_PRESENTATION:
+            cls.previous = None
+            pygame.transform.scale(cls.screen, cls.window.get_size(), cls.window)
+            pygame.display.flip()
+            return
+
+        pixels = cls.screen.get_buffer().raw
+        previous = cls.previous
+        cls.previous = pixels
+        if previous is None or len(previous) != len(pixels):
+            pygame.transform.scale(cls.screen, cls.window.get_size(), cls.window)
+            pygame.display.flip()
+            return
+        if pixels == previous:
+            return
+        rects = [cls.present_rows(top, bottom) for top, bottom in cls.changed_row_bands(pixels, previous)]
+        if rects:
+            pygame.display.update(rects)
+
+    @classmethod
+    def changed_row_bands(cls, pixels, previous):
+        """
+        Finds the rows of the game surface that changed, merging neighbouring bands.
+        :param pixels: The game surface's pixels now
+        :param previous: The game surface's pixels as of the last presentation
+        :return: List of (top, bottom) row ranges, with the bottom row excluded
+        """
+        pitch = cls.screen.get_pitch()
+        height = cls.screen.get_height()
+        bands = []
+        for top in range(0, height, cls.BAND_HEIGHT):
+            bottom = min(top + cls.BAND_HEIGHT, height)
+            if pixels[top * pitch:bottom * pitch] == previous[top * pitch:bottom * pitch]:
+                continue
+            if bands and bands[-1][1] == top:
+                bands[-1] = (bands[-1][0], bottom)
+            else:
+                bands.append((top, bottom))
+        return bands
+
+    @classmethod
+    def present_rows(cls, top, bottom):
+        """
+        Scales some rows of the game surface onto the matching part of the window.
+        :param top: First row to scale
+        :param bottom: Row after the last one to scale
+        :return: The rect of the window that was drawn to
+        """
+        scale_y = cls.window.get_height() // cls.screen.get_height()
+        source = cls.screen.subsurface((0, top, cls.screen.get_width(), bottom - top))
+        rect = pygame.Rect(0, top * scale_y, cls.window.get_width(), (bottom - top) * scale_y)
+        pygame.transform.scale(source, rect.size, cls.window.subsurface(rect))
+        return rect
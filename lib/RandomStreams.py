@@ -0,0 +1,88 @@
+import hashlib
+import random
+
+
+class RandomStreams:
+    """
+    Static class holding a separate random number generator for each subsystem, all derived from one run seed.
+
+    Every stream is reseeded at the start of each level from the run seed and the level number, so the same seed
+    replays the same dungeon and, given the same player input, the same turns, no matter how many random numbers
+    other subsystems used along the way. Purely cosmetic randomness, like particles, keeps using the random module.
+    """
+
+    MAPGEN = "mapgen"  # Room layout
+    SPAWNS = "spawns"  # Which enemies appear where, and how they start
+    DECOR = "decor"  # Decorations on floors and walls
+    AI = "ai"  # Enemy decisions
+    DROPS = "drops"  # What enemies and pages drop
+    TILES = "tiles"  # Tile sprite variations
+    NAMES = (MAPGEN, SPAWNS, DECOR, AI, DROPS, TILES)
+
+    seed = None
+    streams = {}
+
+    @classmethod
+    def seed_run(cls, seed=None):
+        """
+        Starts a run, seeding every stream.
+        :param seed: Integer seed for the run. By default, a new random one.
+        :return: The seed used, which replays the run when passed in again
+        """
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        cls.seed = seed
+        cls.streams = {name: random.Random(cls.derive(seed, name)) for name in cls.NAMES}
+        return seed
+
+    @classmethod
+    def seed_level(cls, level):
+        """
+        Reseeds every stream for the start of a dungeon level.
+        :param level: The dungeon level
+        """
+        seed = cls.level_seed(level)
+        cls.streams = {name: cls.stream_from(seed, name) for name in cls.NAMES}
+
+    @classmethod
+    def level_seed(cls, level):
+        """
+        Returns the seed a dungeon level's streams are derived from, which only depends on the run seed and the level.
+        :param level: The dungeon level
+        :return: The seed
+        """
+        if cls.seed is None:
+            cls.seed_run()
+        return cls.derive(cls.seed, "level", level)
+
+    @classmethod
+    def get(cls, name):
+        """
+        Returns a stream, seeding the run first if that hasn't happened yet.
+        :param name: One of the stream names, like RandomStreams.AI
+        :return: The random.Random for that stream
+        """
+        if cls.seed is None:
+            cls.seed_run()
+        return cls.streams[name]
+
+    @staticmethod
+    def stream_from(seed, name):
+        """
+        Makes a stream from a level seed, as seed_level does. Lets other processes draw the same numbers.
+        :param seed: The level seed
+        :param name: The stream name
+        :return: A new random.Random
+        """
+        return random.Random(RandomStreams.derive(seed, name))
+
+    @staticmethod
+    def derive(seed, *keys):
+        """
+        Derives a seed from another one and some keys, the same way in every process.
+        :param seed: The seed to derive from
+        :param keys: Values to mix in, like a stream name or a level number
+        :return: A 64 bit integer seed
+        """
+        text = "/".join(str(item) for item in (seed,) + keys)
+        return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
@@ -0,0 +1,84 @@
+class RenderQueue:
+    """
+    Collects blits and issues them together with Surface.blits, which saves a Python-level call per sprite.
+
+    Blits are only deferred between begin() and end(); outside of that they happen immediately, so code that mixes
+    queued blits with direct surface.blit calls keeps working. Blits are flushed in the order they were queued,
+    whenever the target surface changes, and before the colorkey or alpha of a surface waiting to be drawn changes.
+    """
+
+    batching = False
+    target = None
+    pending = []  # (source, dest, area, special_flags) tuples, in draw order
+    pending_sources = set()
+
+    @classmethod
+    def begin(cls):
+        """
+        Starts deferring blits.
+        """
+        cls.batching = True
+
+    @classmethod
+    def end(cls):
+        """
+        Draws everything queued and goes back to blitting immediately.
+        """
+        cls.flush()
+        cls.batching = False
+
+    @classmethod
+    def blit(cls, target, source, dest, area=None, special_flags=0):
+        """
+        Draws one surface onto another, now or at the next flush.
+        :param target: The surface to draw on
+        :param source: The surface to draw
+        :param dest: The position to draw at, as (x, y) or a rect
+        :param area: If specified, the part of the source to draw
+        :param special_flags: Blend flags, as for Surface.blit
+        """
+        if not cls.batching:
+            target.blit(source, dest, area, special_flags)
+            return
+        if target is not cls.target:
+            cls.flush()
+            cls.target = target
+        cls.pending.append((source, dest, area, special_flags))
+        cls.pending_sources.add(source)
+
+    @classmethod
+    def flush(cls):
+        """
+        Draws everything queued so far onto its target.
+        """
+        if cls.pending:
+            cls.target.blits(cls.pending, doreturn=False)
+            cls.pending = []
+            cls.pending_sources = set()
+        cls.target = None
+
+    @classmethod
+    def set_colorkey(cls, source, color):
+        """
+        Sets a surface's colorkey, first drawing any queued blits of it that expect the old one.
+        :param source: The surface
+        :param color: The new colorkey, or None to clear it
+        """
+        if source in cls.pending_sources:
+            wanted = None if color is None else tuple(color)[:3] + (255,)
+            if source.get_colorkey() != wanted:
+                cls.flush()
+        source.set_colorkey(color)
+
+    @classmethod
+    def set_alpha(cls, source, alpha):
+        """
+        Sets a surface's alpha, first drawing any queued blits of it that expect the old one.
+        :param source: The surface
+        :param alpha: The new alpha, or None to clear it
+        """
+        if source in cls.pending_sources:
+            wanted = None if alpha is None else int(alpha)
+            if source.get_alpha() != wanted:
+                cls.flush()
+        source.set_alpha(alpha)
@@ -37,6 +37,8 @@ class Settings:
         Settings that can change during runtime
         """
         SHOW_FPS_COUNTER = True
+        DIRTY_RECT_PRESENTATION = False  # Only scale and update the parts of the window that changed each frame
+        PARTICLE_BUDGET = 1500  # Most particles alive at once; effects spawn fewer as this fills up
         KNOWN_SPELLS = ["ZAP", "FLARE", "BOLT", "STAB"]
         KNOWN_ENEMIES = []
         MENU_SHOWN = 0  # Amount of shown between 0 and 1
\ No newline at end of file
@@ -2,7 +2,9 @@ from lib.Primitives import GameObject, Pose
 import pygame
 from lib.ImageHandler import ImageHandler
 import time
+from collections import OrderedDict
 from lib.Settings import Settings
+from lib.RenderQueue import RenderQueue
 
 
 class Sprite(GameObject):
@@ -10,6 +12,10 @@ class Sprite(GameObject):
     Class that holds one or more pygame surfaces for an object.
     """
 
+    DERIVED_CACHE_SIZE = 256  # Number of tinted or scaled surfaces kept before dropping the least recently drawn
+
+    _derived_surfaces = OrderedDict()
+
     colorkey = None
     flipped_x = False
     blend_mode = pygame.BLENDMODE_NONE
@@ -46,7 +52,7 @@ class Sprite(GameObject):
         tint_test = pygame.Surface((1, 1))
         tint_test.fill((255, 255, 255))
         colorkey_test.blit(tint_test, (0, 0), special_flags=pygame.BLEND_MULT)
-        surface.set_colorkey(colorkey_test.get_at((0, 0)))
+        RenderQueue.set_colorkey(surface, colorkey_test.get_at((0, 0)))
 
         # Now actually apply the tint
         tint_surf = mask.to_surface(setcolor=self.tint, unsetcolor=(255, 255, 255))
@@ -54,19 +60,24 @@ class Sprite(GameObject):
         my_surface.blit(tint_surf, (0, 0), special_flags=pygame.BLEND_MULT)
         return my_surface
 
-    def draw(self, surf, offset=(0, 0)):
+    def draw(self, surf, offset=(0, 0), position=None):
+        """
+        Draws the sprite centered on its position.
+        :param surf: The surface to draw on
+        :param offset: Offset to apply to the position, in pixels
+        :param position: If specified, the position to draw at instead of the sprite's own, so one sprite can be
+            drawn for many objects
+        """
+        if position is None:
+            position = self.position
         my_surface = self.get_current_surface()
-        my_surface.set_colorkey(self.colorkey)
-        my_surface.set_alpha(self.alpha)
-        if self.tint != (255, 255, 255):
-            my_surface = self.apply_tint(my_surface)
-        if self.distortion.x != 1 or self.distortion.y != 1:
-            width = int(self.distortion.x * my_surface.get_width())
-            height = int(self.distortion.y * my_surface.get_height())
-
-            width = max(width, 1)
-            height = max(height, 1)
-            my_surface = pygame.transform.scale(my_surface, (width, height))
+        distorted = self.distortion.x != 1 or self.distortion.y != 1
+        if self.tint != (255, 255, 255) or distorted:
+            my_surface = self.get_derived_surface(my_surface)
+        else:
+            RenderQueue.set_colorkey(my_surface, self.colorkey)
+        RenderQueue.set_alpha(my_surface, self.alpha)
+        if distorted:
             rect = my_surface.get_rect()
         else:
             rect = self.get_sprite_rect()
@@ -74,9 +85,39 @@ class Sprite(GameObject):
                 rect = pygame.rect.Rect(*rect)
             if not rect:
                 rect = pygame.rect.Rect(0, 0, my_surface.get_width(), my_surface.get_height())
-        x = self.position.x + offset[0] - rect.width//2
-        y = self.position.y + offset[1] - rect.height//2
-        surf.blit(my_surface, (x, y), rect, special_flags=self.blend_mode)
+        x = position.x + offset[0] - rect.width//2
+        y = position.y + offset[1] - rect.height//2
+        RenderQueue.blit(surf, my_surface, (x, y), rect, self.blend_mode)
+
+    def get_derived_surface(self, surface):
+        """
+        Returns the surface tinted and/or scaled for this sprite, reusing one made for an earlier draw if possible. Scaled
+        sizes are whole pixels, so animations that squish or shrink sprites keep landing on the same few.
+        :param surface: The shared surface to derive from
+        :return: The derived surface. Its alpha still needs setting before drawing it.
+        """
+        size = None
+        if self.distortion.x != 1 or self.distortion.y != 1:
+            width = max(int(self.distortion.x * surface.get_width()), 1)
+            height = max(int(self.distortion.y * surface.get_height()), 1)
+            size = width, height
+        key = surface, self.colorkey, tuple(self.tint), size
+        cache = Sprite._derived_surfaces
+        derived = cache.get(key)
+        if derived is not None:
+            cache.move_to_end(key)
+            return derived
+
+        RenderQueue.set_colorkey(surface, self.colorkey)
+        derived = surface
+        if self.tint != (255, 255, 255):
+            derived = self.apply_tint(derived)
+        if size:
+            derived = pygame.transform.scale(derived, size)
+        cache[key] = derived
+        if len(cache) > Sprite.DERIVED_CACHE_SIZE:
+            cache.popitem(last=False)
+        return derived
 
     def align_with_grid_object(self, grid_object):
         if not grid_object.layer:
@@ -93,6 +134,9 @@ class Sprite(GameObject):
 
 
 class StaticSprite(Sprite):
+
+    _shared_sprites = {}
+
     def __init__(self, surface, alpha=255, colorkey=None, rect=None, flippable = False, blend_mode = pygame.BLENDMODE_NONE):
         super().__init__()
         self.blend_mode = blend_mode
@@ -121,6 +165,23 @@ class StaticSprite(Sprite):
         sprite = StaticSprite(ImageHandler.load(path), flippable=flippable)
         return sprite
 
+    @staticmethod
+    def shared(path, rect=None, colorkey=None):
+        """
+        Returns a sprite shared by everything that draws the same part of the same image, like map tiles. Don't
+        change or align it; draw it with an explicit position instead.
+        :param path: The path of the image
+        :param rect: The part of the image to draw, as (x, y, width, height). By default, the whole image.
+        :param colorkey: The colorkey to draw with, if any
+        :return: The sprite
+        """
+        key = path, tuple(rect) if rect else None, colorkey
+        sprite = StaticSprite._shared_sprites.get(key)
+        if sprite is None:
+            sprite = StaticSprite(ImageHandler.load(path), rect=rect, colorkey=colorkey)
+            StaticSprite._shared_sprites[key] = sprite
+        return sprite
+
     def get_sprite_rect(self):
         if self.flippable and self.flipped_x:
             return self._flipped_static_rect
@@ -136,7 +197,7 @@ class InvisibleSprite(Sprite):
     def __init__(self):
         pass
 
-    def draw(self, surface, offset=(0, 0)):
+    def draw(self, surface, offset=(0, 0), position=None):
         pass
 
     def update(self, dt, events):
@@ -0,0 +1,110 @@
+import pygame
+from collections import OrderedDict
+
+
+class TextHandler:
+    """
+    Static class that caches rendered text, so UI that redraws the same words every frame never renders a font.
+
+    Glyphs are rendered once per (font, size, color, antialiasing), and words are composed from them once and kept
+    until they haven't been drawn in a while. Words come out pixel-for-pixel the same as blitting their glyphs one by
+    one.
+    """
+
+    WORD_CACHE_SIZE = 256  # Number of composed words kept before dropping the least recently used
+    KEY_COLORS = ((255, 0, 255), (0, 255, 0), (0, 0, 1))  # Colorkeys for words, skipping any used by the word itself
+
+    fonts = {}
+    glyph_sets = {}
+    words = OrderedDict()
+
+    @staticmethod
+    def font(path, size):
+        """
+        Loads a font.
+        :param path: The path of the font file
+        :param size: The font size
+        :return: The pygame font
+        """
+        key = path, size
+        font = TextHandler.fonts.get(key)
+        if font is None:
+            font = TextHandler.fonts[key] = pygame.font.Font(path, size)
+        return font
+
+    @staticmethod
+    def glyphs(path, size, color, antialias=False):
+        """
+        Returns the glyph set for a font in a color, which renders each character the first time it's asked for.
+        :param path: The path of the font file
+        :param size: The font size
+        :param color: The text color
+        :param antialias: Whether to render with antialiasing
+        :return: Dictionary-like object from character to surface
+        """
+        key = path, size, tuple(color), bool(antialias)
+        glyph_set = TextHandler.glyph_sets.get(key)
+        if glyph_set is None:
+            glyph_set = TextHandler.glyph_sets[key] = GlyphSet(TextHandler.font(path, size), color, antialias)
+        return glyph_set
+
+    @staticmethod
+    def word(path, size, text, color, antialias=False):
+        """
+        Returns a surface with some text on it, composed from cached glyphs.
+        :param path: The path of the font file
+        :param size: The font size
+        :param text: The text
+        :param color: The text color, or a sequence with one color per character
+        :param antialias: Whether to render with antialiasing
+        :return: The surface. Don't draw on it; it's shared.
+        """
+        if len(color) and not isinstance(color[0], int):
+            colors = tuple(tuple(item) for item in color)
+        else:
+            colors = (tuple(color),) * len(text)
+        key = path, size, text, colors, bool(antialias)
+        words = TextHandler.words
+        word = words.get(key)
+        if word is not None:
+            words.move_to_end(key)
+            return word
+
+        glyphs = [TextHandler.glyphs(path, size, item, antialias)[letter] for letter, item in zip(text, colors)]
+        width = sum(glyph.get_width() for glyph in glyphs)
+        height = max([glyph.get_height() for glyph in glyphs], default=TextHandler.font(path, size).get_height())
+        if antialias:
+            # Antialiased glyphs have per-pixel alpha; they don't overlap, so taking the max copies them over exactly
+            word = pygame.Surface((width, height), pygame.SRCALPHA)
+            flags = pygame.BLEND_RGBA_MAX
+        else:
+            key_color = next(item for item in TextHandler.KEY_COLORS if item not in colors)
+            word = pygame.Surface((width, height))
+            word.fill(key_color)
+            word.set_colorkey(key_color)
+            flags = 0
+        x = 0
+        for glyph in glyphs:
+            word.blit(glyph, (x, 0), special_flags=flags)
+            x += glyph.get_width()
+
+        words[key] = word
+        if len(words) > TextHandler.WORD_CACHE_SIZE:
+            words.popitem(last=False)
+        return word
+
+
+class GlyphSet(dict):
+    """
+    Characters of one font in one color, each rendered the first time it's looked up.
+    """
+
+    def __init__(self, font, color, antialias=False):
+        super().__init__()
+        self.font = font
+        self.color = tuple(color)
+        self.antialias = antialias
+
+    def __missing__(self, letter):
+        glyph = self[letter] = self.font.render(letter, self.antialias, self.color)
+        return glyph